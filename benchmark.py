@@ -0,0 +1,200 @@
+# benchmark.py: Compara o desempenho das varias opções do solver de Bimaru
+# nas instancias dadas (por omissão, em instances-students).
+
+import sys
+import glob
+import time
+import tracemalloc
+import argparse
+
+from bimaruboats import Board, BimaruState, Bimaru
+from search import (
+    Problem,
+    Node,
+    InstrumentedProblem,
+    depth_first_tree_search,
+    depth_first_backtracking_search,
+    backjumping_search,
+    limited_discrepancy_search,
+    depth_bounded_discrepancy_search,
+    depth_first_graph_search,
+    breadth_first_graph_search,
+)
+from utils import print_table
+
+# Configurações do solver (argumentos de Bimaru) comparadas por omissão.
+CONFIGURATIONS = [
+    {"strategy": "largest"},
+    {"strategy": "largest", "symmetry": True},
+    {"strategy": "fewest"},
+    {"strategy": "fewest", "symmetry": True},
+    {"strategy": "hint"},
+    {"strategy": "largest", "order": "slack"},
+    {"strategy": "fewest", "order": "slack", "symmetry": True},
+]
+
+SEARCHERS = {
+    "tree": depth_first_tree_search,
+    "lazy": lambda problem: depth_first_tree_search(problem, lazy=True),
+    "backtracking": depth_first_backtracking_search,
+    # Os nogoods supõem que a ordem dos barcos e indiferente, o que a simetria contraria.
+    "backjumping": lambda problem: backjumping_search(
+        problem, 0 if problem.symmetry else 1000
+    ),
+    "lds": limited_discrepancy_search,
+    "dds": depth_bounded_discrepancy_search,
+}
+
+# Pesquisas em grafo usadas para medir o custo de gerir a fronteira.
+GRAPH_SEARCHERS = {
+    "depth_first_graph_search": depth_first_graph_search,
+    "breadth_first_graph_search": breadth_first_graph_search,
+}
+
+
+class WideProblem(Problem):
+    """Problema sintetico sem solução, em que a fronteira chega a 'width' nós:
+    o estado inicial tem 'width' sucessores e cada um destes tem um unico
+    sucessor, que não tem sucessores."""
+
+    def __init__(self, width: int):
+        super().__init__(0)
+        self.width = width
+
+    def actions(self, state):
+        if state == 0:
+            return range(1, self.width + 1)
+        if state > 0:
+            return [-state]
+        return []
+
+    def result(self, state, action):
+        return action
+
+    def goal_test(self, state):
+        return False
+
+
+def read_instance(path: str):
+    """Lê uma instancia de um ficheiro, no formato aceite por Board.parse_instance."""
+    stdin = sys.stdin
+    with open(path) as file:
+        sys.stdin = file
+        try:
+            return Board.parse_instance()
+        finally:
+            sys.stdin = stdin
+
+
+def run(path: str, searcher, repeat=1, **options):
+    """Resolve uma instancia 'repeat' vezes com as opções dadas e retorna o tempo
+    medio (em ms), o numero de estados expandidos e se foi encontrada uma solução."""
+    start = time.perf_counter()
+    for i in range(repeat):
+        board, hints = read_instance(path)
+        problem = InstrumentedProblem(Bimaru(board, **options))
+        result = searcher(problem)
+    elapsed = (time.perf_counter() - start) * 1000 / repeat
+
+    return elapsed, problem.succs, result is not None
+
+
+def describe(options: dict) -> str:
+    """Devolve uma descrição curta de uma configuração."""
+    return " ".join(
+        key if value is True else str(value) for key, value in options.items()
+    )
+
+
+def compare_options(paths, configurations=CONFIGURATIONS, searcher=None, repeat=1):
+    """Mostra uma tabela com o tempo (ms) e o numero de estados expandidos de cada
+    configuração em cada instancia, bem como o tempo total."""
+    searcher = searcher or depth_first_backtracking_search
+    table = []
+    for options in configurations:
+        row, total = [describe(options)], 0
+        for path in paths:
+            elapsed, expanded, found = run(path, searcher, repeat, **options)
+            total += elapsed
+            row.append("{:.1f}/{}{}".format(elapsed, expanded, "" if found else "!"))
+        table.append(row + ["{:.1f}".format(total)])
+
+    header = ["Configuração"] + [path.split("/")[-1] for path in paths] + ["Total"]
+    print_table(table, header)
+
+
+def frontier_scaling(widths=(1000, 2000, 4000, 8000), searchers=GRAPH_SEARCHERS):
+    """Mostra o tempo (ms) de cada pesquisa em grafo no WideProblem com fronteiras
+    de tamanho crescente. Com uma fronteira de custo constante por nó, o tempo
+    deve crescer linearmente com o tamanho."""
+    table = []
+    for name, searcher in searchers.items():
+        row = [name]
+        for width in widths:
+            start = time.perf_counter()
+            searcher(WideProblem(width))
+            row.append("{:.1f}".format((time.perf_counter() - start) * 1000))
+        table.append(row)
+
+    print_table(table, ["Pesquisa"] + ["fronteira {}".format(w) for w in widths])
+
+
+def node_memory(path: str, count=1000) -> float:
+    """Retorna a memoria (em bytes) ocupada por cada nó da procura na instancia dada,
+    medida com tracemalloc ao criar 'count' filhos da raiz com Node.child_node, como
+    as procuras os criam (a geometria do tabuleiro e partilhada, pelo que não conta).
+    A instancia tem de ter ações na raiz."""
+    board, hints = read_instance(path)
+    problem = Bimaru(board)
+    root = Node(problem.initial)
+    actions = list(problem.actions(problem.initial))
+    if not actions:
+        raise ValueError("The root of " + path + " has no actions")
+
+    # Os filhos ja criados uma vez enchem as caches (ver solve_line), que nao contam.
+    for action in actions:
+        root.child_node(problem, action)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = [root.child_node(problem, actions[i % len(actions)]) for i in range(count)]
+    nodes = [node for node in nodes if node is not None]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / len(nodes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compara as opções do solver de Bimaru (tempo em ms/estados expandidos)."
+    )
+    parser.add_argument("instances", nargs="*")
+    parser.add_argument("--searcher", choices=SEARCHERS, default="backtracking")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--frontier",
+        action="store_true",
+        help="mede o custo da fronteira das pesquisas em grafo (WideProblem)",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="mede a memoria ocupada por cada nó (nó, estado e tabuleiro)",
+    )
+    args = parser.parse_args()
+
+    if args.frontier:
+        frontier_scaling()
+        sys.exit()
+
+    paths = args.instances or sorted(glob.glob("instances-students/*.txt"))
+
+    if args.memory:
+        for path in paths:
+            try:
+                print("{}: {:.0f} bytes/nó".format(path, node_memory(path)))
+            except ValueError:
+                print("{}: sem ações na raiz".format(path))
+        sys.exit()
+    compare_options(paths, searcher=SEARCHERS[args.searcher], repeat=args.repeat)
@@ -7,74 +7,667 @@
 # 102556 Daniel Carvalho
 
 import sys
-import copy
-from search import Problem, Node, depth_first_tree_search
+import math
+import random
+import argparse
+import functools
+from array import array
+from search import (
+    Problem,
+    Node,
+    depth_first_backtracking_search,
+    backjumping_search,
+    restart_search,
+    luby_schedule,
+    geometric_schedule,
+    limited_discrepancy_search,
+    depth_bounded_discrepancy_search,
+    Budget,
+    BudgetExhausted,
+    checkpointed_search,
+    resume_search,
+)
+
+
+def iter_bits(mask: int):
+    """Devolve, por ordem crescente, os indices dos bits a 1 de uma mascara."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Papel de cada simbolo numa linha (para as colunas, trocar "T"/"B" por "L"/"R"):
+# "<" inicio de barco ao longo da linha, ">" fim de barco ao longo da linha,
+# "o" peça isolada na linha, "=" peça com dois vizinhos iguais (ambos barco ou ambos agua),
+# "?" peça qualquer. As peças de barcos ja colocados usam "[", "]", "O" e "#", respetivamente.
+ROW_ROLES = str.maketrans("LRTBCMlrtbcm", "<>ooo=[]OOO#")
+COL_ROLES = str.maketrans("TBLRCMtblrcm", "<>ooo=[]OOO#")
+
+# Frota inicial, que inclui qualquer frota restante: as conclusões de solve_line com esta
+# frota valem para qualquer conjunto de barcos ja colocados.
+FLEET = (4, 3, 2, 1)
+
+
+@functools.lru_cache(maxsize=16384)
+def solve_line(line: str, count: int, fleet: tuple):
+    """Enumera todas as formas de colocar 'count' peças de barco nas posições vazias (" ")
+    de uma linha (ver ROW_ROLES) compativeis com as peças ja presentes e com a frota restante
+    'fleet', e retorna um par de mascaras (posição k no bit k) com as posições vazias que sao
+    agua, e barco, em todas elas, ou None caso nao exista nenhuma."""
+    n = len(line)
+    empty = sum(1 << k for k in range(n) if line[k] == " ")
+    free_after = [line[k:].count(" ") for k in range(n + 1)]
+
+    # Interseção e uniao das posições com barco de todas as formas encontradas.
+    layouts = [(1 << n) - 1, 0, False]
+
+    def fits(k: int, boat: int) -> bool:
+        # Verifica o papel da posição k, ja conhecidos os seus dois vizinhos.
+        role = line[k]
+        prev = k > 0 and bool(boat >> (k - 1) & 1)
+        after = k + 1 < n and bool(boat >> (k + 1) & 1)
+        if role in "<[":
+            return not prev and after
+        if role in ">]":
+            return prev and not after
+        if role in "oO":
+            return not prev and not after
+        if role in "=#":
+            return prev == after
+        return True
+
+    def close_run(start: int, end: int, used: list) -> bool:
+        # Um segmento com duas ou mais peças e um barco ao longo da linha.
+        size = end - start
+        if size < 2 or any(c in "[]O#" for c in line[start:end]):
+            return True
+        if size > len(fleet) or used[size - 1] >= fleet[size - 1]:
+            return False
+        used[size - 1] += 1
+        return True
+
+    def search(k: int, remaining: int, boat: int, run: int, used: list) -> bool:
+        # Retorna True quando ja nao e possivel tirar mais conclusões.
+        if remaining > free_after[k]:
+            return False
+        if k == n:
+            if remaining or (n and not fits(n - 1, boat)):
+                return False
+            if run is not None and not close_run(run, n, used.copy()):
+                return False
+            layouts[0] &= boat
+            layouts[1] |= boat
+            layouts[2] = True
+            return not layouts[0] & empty and layouts[1] & empty == empty
+
+        if line[k] == ".":
+            options = [False]
+        elif line[k] != " ":
+            options = [True]
+        else:
+            options = [True, False] if remaining else [False]
+
+        for is_boat in options:
+            new_boat = boat | (is_boat << k)
+            if k > 0 and not fits(k - 1, new_boat):
+                continue
+
+            new_used = used
+            new_run = run
+            if is_boat and run is None:
+                new_run = k
+            elif not is_boat and run is not None:
+                new_used = used.copy()
+                if not close_run(run, k, new_used):
+                    continue
+                new_run = None
+
+            if search(
+                k + 1,
+                remaining - (is_boat and line[k] == " "),
+                new_boat,
+                new_run,
+                new_used,
+            ):
+                return True
+        return False
+
+    search(0, count, 0, None, [0] * len(fleet))
+    always, sometimes, found = layouts
+    if not found:
+        return None
+
+    return empty & ~sometimes, empty & always
+
+
+class BoardGeometry:
+    """Mascaras constantes de um tabuleiro de uma dada dimensão.
+
+    As mascaras usam uma grelha com uma margem de uma casa a toda a volta, o
+    indice da posição (row, col) e (row + 1) * width + (col + 1). A margem e
+    tratada como agua, pelo que os vizinhos de qualquer posição do tabuleiro
+    estao sempre dentro da grelha."""
+
+    def __init__(self, size: int, max_boat: int = 4) -> None:
+        self.size = size
+        self.width = size + 2
+
+        row = ((1 << size) - 1) << 1
+        col = sum(1 << (self.width * (i + 1)) for i in range(size))
+
+        self.row_masks = [row << (self.width * (i + 1)) for i in range(size)]
+        self.col_masks = [col << (j + 1) for j in range(size)]
+
+        # Indices das posições de cada linha e coluna, por ordem.
+        self.row_indexes = [list(iter_bits(mask)) for mask in self.row_masks]
+        self.col_indexes = [list(iter_bits(mask)) for mask in self.col_masks]
+        self.inside = sum(self.row_masks)
+        self.border = ((1 << (self.width * self.width)) - 1) & ~self.inside
+
+        # Todas as posições legais de cada tamanho de barco, indexadas pela ação
+        # (row, col, tamanho, direção) e agrupadas por tamanho (ver boat_placement).
+        self.boats = {}
+        self.placements = [[] for k in range(max_boat + 1)]
+        for k in range(1, max_boat + 1):
+            for row in range(size):
+                for col in range(size):
+                    for direction in ["H", "V"] if k > 1 else [""]:
+                        placement = self.boat_placement(row, col, k, direction)
+                        if placement is not None:
+                            self.boats[placement[0]] = placement
+                            self.placements[k].append(placement)
+
+        # Chaves de Zobrist de cada simbolo em cada posição (ver Board.hash). As posições
+        # vazias valem 0, pelo que o hash de um tabuleiro vazio e 0.
+        rng = random.Random(size)
+        self.zobrist = {
+            simbol: [rng.getrandbits(64) for i in range(self.width * self.width)]
+            for simbol in Board.symbols
+        }
+        self.zobrist[" "] = [0] * (self.width * self.width)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def of(size: int) -> "BoardGeometry":
+        """Devolve a geometria (partilhada) de um tabuleiro com a dimensão dada."""
+        return BoardGeometry(size)
+
+    def __deepcopy__(self, memo):
+        # A geometria e imutavel e partilhada por todos os tabuleiros do mesmo tamanho.
+        return self
+
+    def __reduce__(self):
+        # Entre processos, basta enviar a dimensão: a geometria e recriada (uma vez) no destino.
+        return BoardGeometry.of, (self.size,)
+
+    def index(self, row: int, col: int) -> int:
+        """Devolve o indice da posição (row, col) nas mascaras."""
+        return (row + 1) * self.width + col + 1
+
+    def position(self, index: int) -> (int, int):
+        """Devolve a posição (row, col) correspondente a um indice das mascaras."""
+        row, col = divmod(index, self.width)
+        return row - 1, col - 1
+
+    def orthogonal(self, mask: int) -> int:
+        """Devolve as posições imediatamente acima, abaixo, a esquerda e a direita das de mask."""
+        return (mask >> self.width) | (mask << self.width) | (mask >> 1) | (mask << 1)
+
+    def diagonal(self, mask: int) -> int:
+        """Devolve as posições na diagonal das de mask."""
+        w = self.width
+        return (
+            (mask >> (w + 1))
+            | (mask >> (w - 1))
+            | (mask << (w - 1))
+            | (mask << (w + 1))
+        )
+
+    def halo(self, mask: int) -> int:
+        """Devolve a vizinhança (ortogonal e diagonal) de mask, excluindo a propria mask."""
+        return (self.orthogonal(mask) | self.diagonal(mask)) & ~mask
+
+    def boat_placement(self, row: int, col: int, size: int, direction: str):
+        """Devolve a ação, as mascaras da primeira posição, das posições do meio, da ultima
+        posição, do barco inteiro e da sua vizinhança, e os simbolos da primeira e da ultima
+        posição de um barco, ou None caso o barco saia do tabuleiro."""
+        if direction == "V":
+            if row + size > self.size:
+                return None
+            step = self.width
+            first_simbol, last_simbol = "T", "B"
+        else:
+            if col + size > self.size:
+                return None
+            step = 1
+            first_simbol, last_simbol = ("L", "R") if size > 1 else ("C", "C")
+
+        first = 1 << self.index(row, col)
+        last = first << (step * (size - 1))
+        body = 0
+        for i in range(size):
+            body |= first << (step * i)
+
+        return (
+            (row, col, size, direction),
+            first,
+            body & ~(first | last),
+            last,
+            body,
+            self.halo(body),
+            first_simbol,
+            last_simbol,
+        )
 
 
 class BimaruState:
+    __slots__ = ("board", "id", "symmetry")
+
     state_id = 0
 
-    def __init__(self, board):
+    def __init__(self, board, symmetry=False):
+        """Com a quebra de simetria (ver Bimaru), os sucessores de um estado dependem
+        tambem dos ultimos barcos colocados de cada tamanho, que passam a contar para a
+        igualdade e para o hash."""
         self.board = board
+        self.symmetry = symmetry
         self.id = BimaruState.state_id
         BimaruState.state_id += 1
 
     def __lt__(self, other):
         return self.id < other.id
 
+    def __eq__(self, other):
+        """Dois estados sao iguais se os seus tabuleiros tiverem o mesmo conteudo,
+        independentemente da ordem pela qual os barcos foram colocados (exceto com a
+        quebra de simetria, em que os ultimos barcos de cada tamanho tem de coincidir).
+        """
+        return (
+            isinstance(other, BimaruState)
+            and self.board.hash == other.board.hash
+            and self.board.cells == other.board.cells
+            and (not self.symmetry or self.board.last_boats == other.board.last_boats)
+        )
+
+    def __hash__(self):
+        # O hash muda com o tabuleiro, pelo que um estado nao deve ser alterado
+        # (ver Bimaru.apply) enquanto estiver num conjunto ou dicionario.
+        if self.symmetry:
+            return hash((self.board.hash, self.board.last_boats.tobytes()))
+        return self.board.hash
+
 
 class Board:
-    """Representação interna de um tabuleiro de Bimaru."""
+    """Representação interna de um tabuleiro de Bimaru.
+
+    Para alem da grelha de simbolos (usada para consultar posições isoladas),
+    o tabuleiro mantem, para cada simbolo, uma mascara de bits (ver
+    BoardGeometry) com as posições onde esse simbolo se encontra. A agua
+    inclui a margem exterior ao tabuleiro."""
+
+    # Simbolos possiveis numa posição: vazio, agua, hints e peças de barco.
+    symbols = " .TBLRMC?tblrmc"
+    empty_simbols = " ."
+
+    # A procura cria muitos tabuleiros, pelo que os campos sao fixos e os contadores
+    # de cada linha e coluna sao guardados em arrays de bytes (com sinal).
+    __slots__ = (
+        "size",
+        "geometry",
+        "cells",
+        "masks",
+        "hash",
+        "rows_hints",
+        "cols_hints",
+        "rows_boats",
+        "cols_boats",
+        "row_spaces",
+        "col_spaces",
+        "boats",
+        "last_boats",
+        "trail",
+        "pending_cells",
+        "pending_rows",
+        "pending_cols",
+        "invalid",
+        "causes",
+        "cause",
+        "conflict",
+    )
 
     def __init__(self, rows, cols) -> None:
-        self.board = [[" " for i in range(10)] for j in range(10)]
+        self.size = len(rows)
+        self.geometry = BoardGeometry.of(self.size)
+
+        # Grelha (com margem) de simbolos, indexada como as mascaras.
+        self.cells = [" " for i in range(self.geometry.width**2)]
+        for i in iter_bits(self.geometry.border):
+            self.cells[i] = "."
+
+        # Mascara de posições de cada simbolo.
+        self.masks = dict.fromkeys(Board.symbols, 0)
+        self.masks[" "] = self.geometry.inside
+        self.masks["."] = self.geometry.border
+
+        # Hash de Zobrist do conteudo das posições do tabuleiro, atualizado a cada escrita.
+        self.hash = 0
 
         # Numero de peças de barco que faltam em cada linha e coluna, contando com as hints.
-        self.rows_hints = rows
-        self.cols_hints = cols
+        self.rows_hints = array("b", rows)
+        self.cols_hints = array("b", cols)
 
         # Numero de peças de barco que faltam em cada linha e coluna, contando so os barcos.
-        self.rows_boats = copy.deepcopy(rows)
-        self.cols_boats = copy.deepcopy(cols)
-
-        # Numero de espaços vazios em cada linha e coluna.
-        self.row_spaces = [10 for i in range(10)]
-        self.col_spaces = [10 for i in range(10)]
+        self.rows_boats = array("b", rows)
+        self.cols_boats = array("b", cols)
 
-        self.remaining_positions = 100
+        # Numero de espaços vazios em cada linha e coluna. As posições vazias do
+        # tabuleiro sao as da mascara de " ".
+        self.row_spaces = array("b", [self.size] * self.size)
+        self.col_spaces = array("b", [self.size] * self.size)
 
         # Numero de barcos restantes de cada tipo, ordenados por tamanho ascendente.
-        self.boats = [4, 3, 2, 1]
+        self.boats = array("b", [4, 3, 2, 1])
 
-    def get_value(self, row: int, col: int) -> str:
-        """Devolve o valor na respetiva posição do tabuleiro."""
-        if row < 0 or row > 9 or col < 0 or col > 9:
-            return "."
+        # Indice da primeira posição do ultimo barco de cada tipo colocado pela procura,
+        # usado para quebrar a simetria entre barcos do mesmo tamanho (ver Bimaru.actions).
+        self.last_boats = array("h", [-1, -1, -1, -1])
+
+        # Alterações feitas ao tabuleiro, (indice, valor antigo) para posições e
+        # (lista, indice, valor antigo) para os restantes contadores, usadas para as desfazer.
+        self.trail = []
+
+        # Posições, linhas e colunas (mascaras de bits) cujas regras de preenchimento
+        # podem ter mudado desde a ultima chamada a cleanup.
+        self.pending_cells = 0
+        self.pending_rows = (1 << self.size) - 1
+        self.pending_cols = (1 << self.size) - 1
 
-        return self.board[row][col]
+        # Passa a True quando o tabuleiro deixa de ter solução (ver set_value e cleanup).
+        self.invalid = False
+
+        # Causas de cada escrita, registadas apenas depois de track_causes (ver
+        # backjumping_search): None, caso contrario.
+        self.causes = None
+        self.cause = 0
+        self.conflict = 0
+
+    def get_value(self, row: int, col: int) -> str:
+        """Devolve o valor na respetiva posição do tabuleiro.
+        Aceita posições ate uma casa fora do tabuleiro, que sao sempre agua."""
+        return self.cells[(row + 1) * self.geometry.width + col + 1]
 
     def set_value(self, row: int, col: int, val: str) -> bool:
-        """Define o valor na respetiva posição do tabuleiro. Caso seja dada uma posição fora do tabuleiro, retorna False."""
-        if row < 0 or row > 9 or col < 0 or col > 9:
+        """Define o valor na respetiva posição do tabuleiro, atualizando os contadores
+        e registando o valor antigo no trail. Caso seja dada uma posição fora do tabuleiro, retorna False.
+        """
+        if row < 0 or row >= self.size or col < 0 or col >= self.size:
             return False
 
-        self.board[row][col] = val
+        index = (row + 1) * self.geometry.width + col + 1
+        self.trail.append((index, self.cells[index]))
+        self.write(index, val)
+        if self.causes is not None:
+            self.trail.append((self.causes, index, self.causes[index]))
+            self.causes[index] = self.cause
+
+        # A linha ou coluna precisa de mais peças do que as que tem ou do que as que cabem.
+        if (
+            self.rows_hints[row] < 0
+            or self.cols_hints[col] < 0
+            or self.rows_hints[row] > self.row_spaces[row]
+            or self.cols_hints[col] > self.col_spaces[col]
+        ):
+            self.count_contradiction(row, col)
+
+        # A posição e os seus vizinhos, bem como a sua linha e coluna, têm de ser revistos.
+        bit = 1 << index
+        self.pending_cells |= (
+            bit | self.geometry.orthogonal(bit)
+        ) & self.geometry.inside
+        self.pending_rows |= 1 << row
+        self.pending_cols |= 1 << col
         return True
 
+    def write(self, index: int, val: str) -> None:
+        """Escreve um valor num indice das mascaras, atualizando as mascaras e os contadores
+        de acordo com o tipo (vazio, agua, hint ou barco) do valor antigo e do novo."""
+        old = self.cells[index]
+        bit = 1 << index
+
+        self.masks[old] ^= bit
+        self.masks[val] |= bit
+        self.cells[index] = val
+
+        zobrist = self.geometry.zobrist
+        self.hash ^= zobrist[old][index] ^ zobrist[val][index]
+
+        row, col = self.geometry.position(index)
+
+        spaces = (val == " ") - (old == " ")
+        self.row_spaces[row] += spaces
+        self.col_spaces[col] += spaces
+
+        hints = (old not in Board.empty_simbols) - (val not in Board.empty_simbols)
+        self.rows_hints[row] += hints
+        self.cols_hints[col] += hints
+
+        boats = old.islower() - val.islower()
+        self.rows_boats[row] += boats
+        self.cols_boats[col] += boats
+
+    def mark(self) -> int:
+        """Devolve uma marca do trail, que permite desfazer todas as alterações feitas a partir deste momento."""
+        return len(self.trail)
+
+    def undo(self, mark: int) -> None:
+        """Desfaz, por ordem inversa, todas as alterações registadas no trail depois da marca dada.
+        As marcas sao tiradas com o tabuleiro estavel e valido, pelo que nao fica nada por propagar.
+        """
+        trail = self.trail
+        while len(trail) > mark:
+            entry = trail.pop()
+
+            if len(entry) == 2:
+                self.write(*entry)
+            else:
+                values, i, old = entry
+                values[i] = old
+
+        self.pending_cells = self.pending_rows = self.pending_cols = 0
+        self.invalid = False
+
+    def copy(self) -> "Board":
+        """Devolve uma copia do tabuleiro, com um trail vazio."""
+        new = Board.__new__(Board)
+        new.size = self.size
+        new.geometry = self.geometry
+        new.cells = self.cells.copy()
+        new.masks = self.masks.copy()
+        new.hash = self.hash
+        new.rows_hints = self.rows_hints[:]
+        new.cols_hints = self.cols_hints[:]
+        new.rows_boats = self.rows_boats[:]
+        new.cols_boats = self.cols_boats[:]
+        new.row_spaces = self.row_spaces[:]
+        new.col_spaces = self.col_spaces[:]
+        new.boats = self.boats[:]
+        new.last_boats = self.last_boats[:]
+        new.trail = []
+        new.pending_cells = self.pending_cells
+        new.pending_rows = self.pending_rows
+        new.pending_cols = self.pending_cols
+        new.invalid = self.invalid
+        new.causes = None if self.causes is None else self.causes.copy()
+        new.cause = self.cause
+        new.conflict = self.conflict
+        return new
+
+    def __getstate__(self):
+        """Forma compacta do tabuleiro, usada pelo pickle para o enviar entre processos:
+        as posições numa string e os contadores em bytes. As mascaras e o hash sao
+        reconstruidos a partir das posições e nem o trail nem as causas sao enviados."""
+        return (
+            self.size,
+            "".join(self.cells),
+            self.rows_hints.tobytes(),
+            self.cols_hints.tobytes(),
+            self.rows_boats.tobytes(),
+            self.cols_boats.tobytes(),
+            self.row_spaces.tobytes(),
+            self.col_spaces.tobytes(),
+            self.boats.tobytes(),
+            self.last_boats.tobytes(),
+            self.pending_cells,
+            self.pending_rows,
+            self.pending_cols,
+            self.invalid,
+        )
+
+    def __setstate__(self, state) -> None:
+        """Reconstroi um tabuleiro a partir da forma compacta devolvida por __getstate__."""
+        (
+            self.size,
+            cells,
+            rows_hints,
+            cols_hints,
+            rows_boats,
+            cols_boats,
+            row_spaces,
+            col_spaces,
+            boats,
+            last_boats,
+            self.pending_cells,
+            self.pending_rows,
+            self.pending_cols,
+            self.invalid,
+        ) = state
+        self.geometry = BoardGeometry.of(self.size)
+        self.cells = list(cells)
+
+        self.masks = dict.fromkeys(Board.symbols, 0)
+        for index, simbol in enumerate(self.cells):
+            self.masks[simbol] |= 1 << index
+
+        # A margem nao conta para o hash (ver write).
+        self.hash = 0
+        zobrist = self.geometry.zobrist
+        for index in iter_bits(self.geometry.inside):
+            self.hash ^= zobrist[self.cells[index]][index]
+
+        self.rows_hints = array("b", rows_hints)
+        self.cols_hints = array("b", cols_hints)
+        self.rows_boats = array("b", rows_boats)
+        self.cols_boats = array("b", cols_boats)
+        self.row_spaces = array("b", row_spaces)
+        self.col_spaces = array("b", col_spaces)
+        self.boats = array("b", boats)
+        self.last_boats = array("h", last_boats)
+        self.trail = []
+        self.causes = None
+        self.cause = self.conflict = 0
+
+    def pieces_mask(self) -> int:
+        """Devolve a mascara de todas as posições com peças de barco (hints, placeholders e barcos)."""
+        return self.geometry.inside & ~(self.masks[" "] | self.masks["."])
+
+    def placed_mask(self) -> int:
+        """Devolve a mascara das posições com peças de barcos ja colocados."""
+        masks = self.masks
+        return (
+            masks["t"] | masks["b"] | masks["l"] | masks["r"] | masks["m"] | masks["c"]
+        )
+
+    def track_causes(self) -> None:
+        """Passa a registar a causa de cada escrita: o conjunto (mascara de bits, bit l
+        para o nivel l) dos niveis de decisão da procura de que o valor escrito depende.
+        As posições ja escritas nao dependem de nenhuma decisão. Apos as posições, causes
+        guarda as causas do numero de barcos restantes e de last_boats de cada tamanho.
+        """
+        self.causes = [0] * (len(self.cells) + 8)
+        self.cause = self.conflict = 0
+
+    def explain(self, mask: int) -> int:
+        """Devolve a uniao das causas das posições da mascara dada."""
+        causes = self.causes
+        cause = 0
+        for index in iter_bits(mask):
+            cause |= causes[index]
+        return cause
+
+    def because(self, mask: int) -> int:
+        """Atribui as escritas seguintes as causas das posições da mascara dada, que
+        sao as lidas pela regra que vai escrever. Retorna a causa anterior, que a regra
+        repõe no fim."""
+        cause = self.cause
+        if self.causes is not None:
+            self.cause = self.explain(mask)
+        return cause
+
+    def fleet_cause(self, size: int = 0) -> int:
+        """Devolve a causa do numero de barcos restantes do tamanho dado (por omissão,
+        de todos os tamanhos)."""
+        if self.causes is None:
+            return 0
+        start = len(self.cells)
+        if size:
+            return self.causes[start + size - 1]
+        return (
+            self.causes[start]
+            | self.causes[start + 1]
+            | self.causes[start + 2]
+            | self.causes[start + 3]
+        )
+
+    def contradiction(self, mask: int = 0, cause: int = 0) -> None:
+        """Marca o tabuleiro como invalido. O conflito e explicado pela regra atual, pelas
+        posições da mascara dada e pela causa dada."""
+        if self.causes is not None and not self.invalid:
+            self.conflict = self.cause | self.explain(mask) | cause
+        self.invalid = True
+
+    def count_contradiction(self, row: int, col: int) -> None:
+        """Marca o tabuleiro como invalido por a linha ou a coluna da posição dada ter
+        peças de barco a mais ou agua a mais. O conflito e explicado apenas pelas peças
+        (ou pela agua) que bastam para isso, as que dependem das decisões menos profundas.
+        """
+        if self.causes is None:
+            self.invalid = True
+            return
+
+        geometry = self.geometry
+        for line, hints, spaces in [
+            (geometry.row_masks[row], self.rows_hints[row], self.row_spaces[row]),
+            (geometry.col_masks[col], self.cols_hints[col], self.col_spaces[col]),
+        ]:
+            pieces = line & self.pieces_mask()
+            if hints < 0:
+                # Peças a mais: bastam N + 1 das peças da linha, sendo N o seu numero.
+                mask, count = pieces, bin(pieces).count("1") + hints + 1
+            elif hints > spaces:
+                # Agua a mais: bastam size - N + 1 das posições com agua.
+                water = line & self.masks["."]
+                mask, count = water, bin(water).count("1") - (hints - spaces) + 1
+            else:
+                continue
+
+            causes = sorted(
+                (self.causes[i] for i in iter_bits(mask)), key=int.bit_length
+            )
+            cause = 0
+            for c in causes[:count]:
+                cause |= c
+            if not self.invalid:
+                self.conflict = cause
+            self.invalid = True
+            return
+
     def place_hint(self, row: int, col: int, val: str) -> None:
         """Coloca uma hint (exceto agua) na respetiva posição do tabuleiro."""
         if self.get_value(row, col) != " " or val in [".", "W"]:
             return
 
         if self.set_value(row, col, val):
-            self.remaining_positions -= 1
-
-            self.row_spaces[row] -= 1
-            self.col_spaces[col] -= 1
-
-            self.rows_hints[row] -= 1
-            self.cols_hints[col] -= 1
-
             self.clear_surroundings(row, col)
             for pos in [
                 (row - 1, col),
@@ -92,30 +685,12 @@ class Board:
             return
 
         self.set_value(row, col, " ")
-        self.remaining_positions += 1
-
-        self.row_spaces[row] += 1
-        self.col_spaces[col] += 1
-
-        self.rows_hints[row] += 1
-        self.cols_hints[col] += 1
 
     def place_boat_piece(self, row: int, col: int, val: int) -> None:
         """Coloca uma peça de barco na respetiva posição, caso haja uma hint no local,
         remove-a antes de colocar a peça de barco."""
         self.remove_hint(row, col)
         if self.set_value(row, col, val):
-            self.row_spaces[row] -= 1
-            self.col_spaces[col] -= 1
-
-            self.rows_boats[row] -= 1
-            self.cols_boats[col] -= 1
-
-            self.rows_hints[row] -= 1
-            self.cols_hints[col] -= 1
-
-            self.remaining_positions -= 1
-
             self.clear_surroundings(row, col)
             for pos in [
                 (row - 1, col),
@@ -131,10 +706,6 @@ class Board:
             return
 
         if self.set_value(row, col, "."):
-            self.row_spaces[row] -= 1
-            self.col_spaces[col] -= 1
-            self.remaining_positions -= 1
-
             for pos in [
                 (row - 1, col),
                 (row + 1, col),
@@ -143,13 +714,24 @@ class Board:
             ]:
                 self.decide_position(*pos)
 
-    def place_boat(self, row: int, col: int, size: int, direction: str) -> None:
-        """Coloca um barco completo dada a posição inicial, direção e tamanho"""
+    def place_boat(self, row: int, col: int, size: int, direction: str) -> bool:
+        """Coloca um barco completo dada a posição inicial, direção e tamanho.
+        Retorna False caso o tabuleiro fique invalido."""
+        self.trail.append((self.boats, size - 1, self.boats[size - 1]))
         self.boats[size - 1] -= 1
+        if self.causes is not None:
+            slot = len(self.cells) + size - 1
+            self.trail.append((self.causes, slot, self.causes[slot]))
+            self.causes[slot] |= self.cause
+        if self.boats[size - 1] < 0:
+            self.contradiction(cause=self.fleet_cause(size))
+
+        # A frota restante e usada por solve_line em todas as linhas e colunas.
+        self.pending_rows = self.pending_cols = (1 << self.size) - 1
 
         if size == 1:
             self.place_boat_piece(row, col, "c")
-            return
+            return not self.invalid
 
         if direction == "H":
             self.place_boat_piece(row, col, "l")
@@ -170,25 +752,28 @@ class Board:
 
             self.place_boat_piece(row + i, col, "b")
 
-    def adjacent_vertical_values(self, row: int, col: int) -> (str, str):
-        """Devolve os valores imediatamente acima e abaixo,
-        respectivamente."""
-        return (self.get_value(row - 1, col), self.get_value(row + 1, col))
+        return not self.invalid
 
-    def adjacent_horizontal_values(self, row: int, col: int) -> (str, str):
-        """Devolve os valores imediatamente à esquerda e à direita,
-        respectivamente."""
-        return (self.get_value(row, col - 1), self.get_value(row, col + 1))
+    def place_water_mask(self, mask: int) -> None:
+        """Coloca agua em todas as posições vazias da mascara dada.
+        Caso alguma das posições tenha uma peça de barco, o tabuleiro fica invalido."""
+        if mask & self.pieces_mask():
+            self.contradiction(mask & self.pieces_mask())
+            return
 
-    def adjacent_diagonal_values(self, row: int, col: int) -> (str, str, str, str):
-        """Devolve os valores imediatamente acima a esquerda, acima a direita, abaixo a esquerda e abaixo a direita,
-        respectivamente."""
-        return (
-            self.get_value(row - 1, col - 1),
-            self.get_value(row - 1, col + 1),
-            self.get_value(row + 1, col - 1),
-            self.get_value(row + 1, col + 1),
-        )
+        for index in iter_bits(mask & self.masks[" "]):
+            self.place_water(*self.geometry.position(index))
+
+    def place_hint_mask(self, mask: int, val: str) -> None:
+        """Coloca uma hint em todas as posições vazias da mascara dada.
+        Caso alguma das posições seja agua (ou fora do tabuleiro), o tabuleiro fica invalido.
+        """
+        if mask & self.masks["."]:
+            self.contradiction(mask & self.masks["."])
+            return
+
+        for index in iter_bits(mask & self.masks[" "]):
+            self.place_hint(*self.geometry.position(index), val)
 
     def clear_surroundings(self, row: int, col: int) -> None:
         """Preenche a vizinhança de uma posição, baseado no conteudo dela mesma."""
@@ -197,303 +782,381 @@ class Board:
         if current_simbol in [" ", "."]:
             return
 
-        positions_to_clear = [
-            (row - 1, col - 1),
-            (row - 1, col + 1),
-            (row + 1, col - 1),
-            (row + 1, col + 1),
-        ]
+        geometry = self.geometry
+        bit = 1 << geometry.index(row, col)
+        water = self.masks["."]
+        cause = self.because(bit | geometry.orthogonal(bit))
 
-        up, down = (row - 1, col), (row + 1, col)
-        left, right = (row, col - 1), (row, col + 1)
+        positions_to_clear = geometry.diagonal(bit)
 
-        up_value, down_value = self.adjacent_vertical_values(row, col)
-        left_value, right_value = self.adjacent_horizontal_values(row, col)
+        up, down = bit >> geometry.width, bit << geometry.width
+        left, right = bit >> 1, bit << 1
 
         if current_simbol in ["m", "M"]:
             # Significa que o barco e horizontal, logo existem peças a esquerda e direita.
-            if up_value == "." or down_value == ".":
-                self.place_hint(*left, "?")
-                self.place_hint(*right, "?")
+            if water & (up | down):
+                self.place_hint_mask(left | right, "?")
 
             # Significa que o barco e vertical, logo existem peças acima e abaixo.
-            if left_value == "." or right_value == ".":
-                self.place_hint(*up, "?")
-                self.place_hint(*down, "?")
+            if water & (left | right):
+                self.place_hint_mask(up | down, "?")
 
             # Significa que e um barco horizontal.
-            if up_value == ".":
-                positions_to_clear.append(down)
-            elif down_value == ".":
-                positions_to_clear.append(up)
+            if water & up:
+                positions_to_clear |= down
+            elif water & down:
+                positions_to_clear |= up
             # Significa que e um barco vertical.
-            elif left_value == ".":
-                positions_to_clear.append(right)
-            elif right_value == ".":
-                positions_to_clear.append(left)
+            elif water & left:
+                positions_to_clear |= right
+            elif water & right:
+                positions_to_clear |= left
         elif current_simbol == "?":
             pass
         else:
             if current_simbol not in ["t", "T"]:
-                positions_to_clear.append(down)
+                positions_to_clear |= down
             if current_simbol not in ["b", "B"]:
-                positions_to_clear.append(up)
+                positions_to_clear |= up
             if current_simbol not in ["l", "L"]:
-                positions_to_clear.append(right)
+                positions_to_clear |= right
             if current_simbol not in ["r", "R"]:
-                positions_to_clear.append(left)
+                positions_to_clear |= left
 
             if current_simbol in ["t", "T"]:
-                self.place_hint(row + 1, col, "?")
+                self.place_hint_mask(down, "?")
             if current_simbol in ["b", "B"]:
-                self.place_hint(row - 1, col, "?")
+                self.place_hint_mask(up, "?")
             if current_simbol in ["l", "L"]:
-                self.place_hint(row, col + 1, "?")
+                self.place_hint_mask(right, "?")
             if current_simbol in ["r", "R"]:
-                self.place_hint(row, col - 1, "?")
+                self.place_hint_mask(left, "?")
 
-        for pos in positions_to_clear:
-            self.place_water(*pos)
+        self.place_water_mask(positions_to_clear)
+        self.cause = cause
 
     def decide_position(self, row: int, col: int) -> None:
         """Tenta descobrir que tipo de peça de barco e um dado placeholder ('?'), caso nao consiga, mantem."""
         if self.get_value(row, col) != "?":
             return
 
-        up, down = self.adjacent_vertical_values(row, col)
-        left, right = self.adjacent_horizontal_values(row, col)
+        geometry = self.geometry
+        bit = 1 << geometry.index(row, col)
+        up, down = bit >> geometry.width, bit << geometry.width
+        left, right = bit >> 1, bit << 1
 
         # Caso algum vizinho ainda esteja vazio, nao e possivel dizer com certeza qual o tipo de peça.
-        if up == " " or down == " " or left == " " or right == " ":
+        if self.masks[" "] & (up | down | left | right):
             return
 
-        if up == ".":
-            if down == ".":
-                if left == ".":
-                    if right == ".":
+        water = self.masks["."]
+        if water & up:
+            if water & down:
+                if water & left:
+                    if water & right:
                         new = "C"
                     else:
                         new = "L"
                 else:
-                    if right == ".":
+                    if water & right:
                         new = "R"
                     else:
                         new = "M"
             else:
                 new = "T"
         else:
-            if down == ".":
+            if water & down:
                 new = "B"
             else:
                 new = "M"
 
+        cause = self.because(bit | up | down | left | right)
         self.remove_hint(row, col)
         self.place_hint(row, col, new)
+        self.cause = cause
 
-    def fill_rows_cols(self) -> None:
-        """Preenche com agua todas as linhas ou colunas cujo numero de peças de barco restantes seja nulo."""
-        for i in range(10):
-            if self.rows_hints[i] == 0:
-                for j in range(10):
-                    self.place_water(i, j)
-
-        for j in range(10):
-            if self.cols_hints[j] == 0:
-                for i in range(10):
-                    self.place_water(i, j)
-
-    def complete_rows_cols(self) -> None:
-        """Completa com placeholders ('?') todas as linhas e colunas
-        cujo numero de peças de barco restantes seja igual ao numero de espaços vazios.
-        """
-        for i in range(10):
-            if self.row_spaces[i] == self.rows_hints[i]:
-                for j in range(10):
-                    self.place_hint(i, j, "?")
-
-        for j in range(10):
-            if self.col_spaces[j] == self.cols_hints[j]:
-                for i in range(10):
-                    self.place_hint(i, j, "?")
-
-    def cleanup(self) -> None:
-        """Executa, em ciclo, as funçoes descritas acima de forma a tentar
-        preencher o numero maximo de espaços, para quando uma iteração nao alterou nada no board.
+    def fill_line(self, indexes: list, hints: int, spaces: int, roles: dict) -> None:
+        """Preenche com agua uma linha ou coluna (dada pelos indices das suas posições)
+        cujo numero de peças de barco restantes seja nulo, ou com placeholders ('?') caso
+        este seja igual ao numero de espaços vazios. Nos restantes casos, usa solve_line
+        para preencher as posições que sao iguais em todas as formas de completar a linha.
         """
-        current_remaining = -1
-
-        while current_remaining != self.remaining_positions:
-            current_remaining = self.remaining_positions
-
-            self.fill_rows_cols()
-
-            for i in range(10):
-                for j in range(10):
-                    self.clear_surroundings(i, j)
-
-            self.complete_rows_cols()
+        if spaces == 0:
+            return
 
-            for i in range(10):
-                for j in range(10):
-                    self.decide_position(i, j)
+        # As conclusões dependem da linha e, caso sejam precisas, da frota restante.
+        # Com causas, as que se tiram sem a frota (ver FLEET) dependem so da linha.
+        cause = self.cause
+        if self.causes is not None:
+            self.cause = 0
+            for k in indexes:
+                self.cause |= self.causes[k]
+        line_cause, fleet_cause, fleet_only = self.cause, 0, 0
+        if hints == 0:
+            water, boat = (1 << len(indexes)) - 1, 0
+        elif spaces == hints:
+            water, boat = 0, (1 << len(indexes)) - 1
+        else:
+            line = "".join([self.cells[k] for k in indexes]).translate(roles)
+            solution = solve_line(line, hints, tuple(self.boats))
+            if self.causes is not None:
+                fleet_cause = self.fleet_cause()
+                relaxed = solve_line(line, hints, FLEET)
+                if relaxed is None:
+                    fleet_cause = 0
+                elif solution is not None:
+                    fleet_only = (solution[0] & ~relaxed[0]) | (
+                        solution[1] & ~relaxed[1]
+                    )
+            if solution is None:
+                self.contradiction(cause=fleet_cause)
+                self.cause = cause
+                return
+            water, boat = solution
+
+        position = self.geometry.position
+        for k in iter_bits(water):
+            self.cause = line_cause | (fleet_cause if fleet_only >> k & 1 else 0)
+            self.place_water(*position(indexes[k]))
+        for k in iter_bits(boat):
+            self.cause = line_cause | (fleet_cause if fleet_only >> k & 1 else 0)
+            self.place_hint(*position(indexes[k]), "?")
+        self.cause = cause
+
+    def cleanup(self) -> bool:
+        """Aplica as regras de preenchimento (clear_surroundings, decide_position e fill_line)
+        apenas as posições, linhas e colunas pendentes, ou seja, afetadas por alguma alteração.
+        Cada alteração feita pelas regras torna pendentes as posições, linhas e colunas que afeta,
+        e o ciclo termina quando nao ha nada pendente e place_guaranteed_boats nao altera nada.
+        Retorna False, parando de imediato, assim que o tabuleiro fica invalido.
+        """
+        geometry = self.geometry
+        checked = -1
+
+        while not self.invalid:
+            if self.pending_cells:
+                low = self.pending_cells & -self.pending_cells
+                self.pending_cells ^= low
+
+                row, col = geometry.position(low.bit_length() - 1)
+                self.clear_surroundings(row, col)
+                self.decide_position(row, col)
+            elif self.pending_rows:
+                low = self.pending_rows & -self.pending_rows
+                self.pending_rows ^= low
+
+                i = low.bit_length() - 1
+                self.fill_line(
+                    geometry.row_indexes[i],
+                    self.rows_hints[i],
+                    self.row_spaces[i],
+                    ROW_ROLES,
+                )
+            elif self.pending_cols:
+                low = self.pending_cols & -self.pending_cols
+                self.pending_cols ^= low
+
+                j = low.bit_length() - 1
+                self.fill_line(
+                    geometry.col_indexes[j],
+                    self.cols_hints[j],
+                    self.col_spaces[j],
+                    COL_ROLES,
+                )
+            elif checked != len(self.trail):
+                checked = len(self.trail)
+                self.place_guaranteed_boats()
+            else:
+                # As peças que faltam nas linhas tem de ser as dos barcos que faltam.
+                fleet = sum((k + 1) * self.boats[k] for k in range(len(self.boats)))
+                if sum(self.rows_boats) != fleet or sum(self.cols_boats) != fleet:
+                    self.contradiction(geometry.inside, self.fleet_cause())
+                break
+
+        return not self.invalid
+
+    def set_last_boat(self, row: int, col: int, size: int) -> None:
+        """Regista (no trail) a posição do ultimo barco de um dado tamanho colocado pela procura."""
+        self.trail.append((self.last_boats, size - 1, self.last_boats[size - 1]))
+        self.last_boats[size - 1] = self.geometry.index(row, col)
+        if self.causes is not None:
+            slot = len(self.cells) + 4 + size - 1
+            self.trail.append((self.causes, slot, self.causes[slot]))
+            self.causes[slot] = self.cause
+
+    def boat_fits(self, placement, free: int, pieces: int) -> bool:
+        """Verifica se um barco (ver BoardGeometry.boat_placement) pode ser colocado, dadas as
+        mascaras das posições livres (para alem das hints certas) e das peças de barco.
+        """
+        _, first, middle, last, _, surroundings, first_simbol, last_simbol = placement
+        masks = self.masks
 
-            self.place_guaranteed_boats()
+        # A vizinhança do barco nao pode ter peças de barco.
+        return (
+            not surroundings & pieces
+            and bool(first & (free | masks[first_simbol]))
+            and bool(last & (free | masks[last_simbol]))
+            and not middle & ~(free | masks["M"])
+        )
 
     def check_boat(self, row: int, col: int, size: int, direction: str, hard=False):
         """Verifica se é possivel colocar um barco de um dado tamanho e com uma dada direçao numa posição dada.
         Caso, hard seja True, apenas verifica se é possivel construir um barco com hints.
         """
-        value = self.get_value(row, col)
-        up, down = self.adjacent_vertical_values(row, col)
-        left, right = self.adjacent_horizontal_values(row, col)
-
-        values_empty = [".", " "]
-        values_top = ["T"] if hard else ["T", "?", " "]
-        values_bot = ["B"] if hard else ["B", "?", " "]
-        values_left = ["L"] if hard else ["L", "?", " "]
-        values_right = ["R"] if hard else ["R", "?", " "]
-        values_circle = ["C"] if hard else ["C", "?", " "]
-        values_mid = ["M"] if hard else ["M", "?", " "]
-
-        # Caso o barco seja um "C"
-        if size == 1:
-            if (
-                (up not in values_empty)
-                or (down not in values_empty)
-                or (left not in values_empty)
-                or (right not in values_empty)
-            ):
-                return False
-            if value not in values_circle:
-                return False
-
-        if direction == "H":
-            if (
-                (up not in values_empty)
-                or (down not in values_empty)
-                or (left not in values_empty)
-            ):
-                return False
-
-            if value not in values_left:
-                return False
-
-            i = 1
-            while i < size - 1:
-                up, down = self.adjacent_vertical_values(row, col + i)
-
-                if (up not in values_empty) or (down not in values_empty):
-                    return False
-
-                if self.get_value(row, col + i) not in values_mid:
-                    return False
-
-                i += 1
-
-            up, down = self.adjacent_vertical_values(row, col + i)
-            left, right = self.adjacent_horizontal_values(row, col + i)
-            if (
-                (up not in values_empty)
-                or (down not in values_empty)
-                or (right not in values_empty)
-            ):
-                return False
-
-            if self.get_value(row, col + i) not in values_right:
-                return False
-
-        if direction == "V":
-            if (
-                (up not in values_empty)
-                or (left not in values_empty)
-                or (right not in values_empty)
-            ):
-                return False
-
-            if value not in values_top:
-                return False
-
-            i = 1
-            while i < size - 1:
-                left, right = self.adjacent_horizontal_values(row + i, col)
-
-                if (left not in values_empty) or (right not in values_empty):
-                    return False
-
-                if self.get_value(row + i, col) not in values_mid:
-                    return False
-
-                i += 1
-
-            up, down = self.adjacent_vertical_values(row + i, col)
-            left, right = self.adjacent_horizontal_values(row + i, col)
-            if (
-                (left not in values_empty)
-                or (right not in values_empty)
-                or (down not in values_empty)
-            ):
-                return False
-
-            if self.get_value(row + i, col) not in values_bot:
-                return False
+        placement = self.geometry.boats.get((row, col, size, direction))
+        if placement is None:
+            return False
 
-        return True
+        free = 0 if hard else self.masks["?"] | self.masks[" "]
+        return self.boat_fits(placement, free, self.pieces_mask())
 
     def check_positions_boat(self, size: int):
         """
         Retorna todas as posiçoes do board onde e possivel colocar um barco de um tamanho dado.
+        Percorre a tabela de posições legais do tamanho dado, guardada na geometria do board.
         """
-        # Otimizar meeter >= size
-        avail_rows = [i for i in range(10) if self.rows_boats[i] > 0]
-        avail_rows.sort(key=(lambda x: self.rows_hints[x]))
-        avail_cols = [i for i in range(10) if self.cols_boats[i] > 0]
-        avail_cols.sort(key=(lambda x: self.cols_hints[x]))
+        geometry = self.geometry
+        free = self.masks["?"] | self.masks[" "]
+        pieces = self.pieces_mask()
+
+        # Posições em linhas ou colunas onde ja nao cabem mais peças de barco.
+        full = 0
+        for i in range(self.size):
+            if self.rows_boats[i] <= 0:
+                full |= geometry.row_masks[i]
+            if self.cols_boats[i] <= 0:
+                full |= geometry.col_masks[i]
 
         positions = []
-        if size == 1:
-            for i in avail_rows:
-                for j in avail_cols:
-                    if self.check_boat(i, j, 1, ""):
-                        positions.append((i, j, size, ""))
-
-            return positions
-
-        for i in avail_rows:
-            for j in avail_cols:
-                if self.rows_boats[i] >= size and self.check_boat(i, j, size, "H"):
-                    positions.append((i, j, size, "H"))
-
-                if self.cols_boats[j] >= size and self.check_boat(i, j, size, "V"):
-                    positions.append((i, j, size, "V"))
-
+        for placement in geometry.placements[size]:
+            action = placement[0]
+            row, col, _, direction = action
+
+            if placement[4] & full:
+                continue
+            if direction == "H" and self.rows_boats[row] < size:
+                continue
+            if direction == "V" and self.cols_boats[col] < size:
+                continue
+
+            if self.boat_fits(placement, free, pieces):
+                positions.append(action)
+
+        # Ordena pelo numero de peças que faltam na linha (ou coluna) do barco,
+        # desempatando pelas peças que faltam na linha e na coluna da primeira posição.
         positions.sort(
             key=(
-                lambda x: self.cols_hints[x[1]]
-                if x[3] == "V"
-                else self.rows_hints[x[0]]
+                lambda x: (
+                    self.line_hints(x),
+                    self.rows_hints[x[0]],
+                    x[0],
+                    self.cols_hints[x[1]],
+                    x[1],
+                    x[3],
+                )
             ),
         )
         return positions
 
+    def line_hints(self, action) -> int:
+        """Devolve o numero de peças que faltam na linha (ou coluna) do barco dado."""
+        row, col, _, direction = action
+        return self.cols_hints[col] if direction == "V" else self.rows_hints[row]
+
+    def exclusions(self, placements, symmetry=False) -> int:
+        """Devolve a uniao das causas pelas quais check_positions_boat (e, caso symmetry
+        seja True, a quebra de simetria de Bimaru.positions) exclui os barcos dados (ver
+        BoardGeometry.boat_placement) que nao sao possiveis. Havendo varias razões para
+        excluir um barco, fica a que depende das decisões menos profundas."""
+        geometry, masks, causes = self.geometry, self.masks, self.causes
+        free = masks["?"] | masks[" "]
+        pieces = self.pieces_mask()
+        row_causes = [self.explain(mask) for mask in geometry.row_masks]
+        col_causes = [self.explain(mask) for mask in geometry.col_masks]
+
+        conflict = 0
+        for placement in placements:
+            action, first, middle, last, _, surroundings, first_simbol, last_simbol = (
+                placement
+            )
+            row, col, size, direction = action
+            if direction == "V":
+                rows, cols = range(row, row + size), [col]
+            else:
+                rows, cols = [row], range(col, col + size)
+
+            # Linhas ou colunas sem lugar para o barco.
+            reasons = [row_causes[i] for i in rows if self.rows_boats[i] <= 0]
+            reasons += [col_causes[j] for j in cols if self.cols_boats[j] <= 0]
+            if direction == "H" and self.rows_boats[row] < size:
+                reasons.append(row_causes[row])
+            if direction == "V" and self.cols_boats[col] < size:
+                reasons.append(col_causes[col])
+
+            # Posições que impedem o barco (ver boat_fits).
+            if surroundings & pieces:
+                reasons += [causes[i] for i in iter_bits(surroundings & pieces)]
+            if not first & (free | masks[first_simbol]):
+                reasons.append(causes[first.bit_length() - 1])
+            if not last & (free | masks[last_simbol]):
+                reasons.append(causes[last.bit_length() - 1])
+            if middle & ~(free | masks["M"]):
+                reasons += [causes[i] for i in iter_bits(middle & ~(free | masks["M"]))]
+
+            if symmetry and geometry.index(row, col) <= self.last_boats[size - 1]:
+                reasons.append(causes[len(self.cells) + 4 + size - 1])
+
+            if reasons:
+                conflict |= min(reasons, key=int.bit_length)
+        return conflict
+
+    def completable(self) -> bool:
+        """Verifica condições necessarias para que o tabuleiro tenha solução, dadas as peças
+        que faltam em cada linha e coluna e os barcos que faltam: cada tamanho tem de ter
+        pelo menos tantas posições possiveis (ver check_positions_boat) como barcos por
+        colocar, e cada peça de barco ainda por cobrir tem de caber numa dessas posições.
+        """
+        if self.invalid:
+            return False
+
+        uncovered = self.pieces_mask() & ~self.placed_mask()
+        for k in range(1, len(self.boats) + 1):
+            if self.boats[k - 1] == 0:
+                continue
+            positions = self.check_positions_boat(k)
+            if len(positions) < self.boats[k - 1]:
+                return False
+            for action in positions:
+                uncovered &= ~self.geometry.boats[action][4]
+        return not uncovered
+
     def place_guaranteed_boats(self) -> None:
         """Verifica e coloca todos os barcos que sejam formados na totalidade por hints."""
-        for i in range(10):
-            for j in range(10):
-                value = self.get_value(i, j)
-
-                if value == "C":
-                    if self.check_boat(i, j, 1, "", True):
-                        self.place_boat(i, j, 1, "")
-                elif value == "T":
-                    for k in range(2, 5):
-                        if self.check_boat(i, j, k, "V", True):
-                            self.place_boat(i, j, k, "V")
-                            break
-                elif value == "L":
-                    for k in range(2, 5):
-                        if self.check_boat(i, j, k, "H", True):
-                            self.place_boat(i, j, k, "H")
-                            break
+        masks = self.masks
+        for index in iter_bits(masks["C"] | masks["T"] | masks["L"]):
+            i, j = self.geometry.position(index)
+            value = self.get_value(i, j)
+
+            if value == "C":
+                if self.check_boat(i, j, 1, "", True):
+                    self.place_guaranteed_boat(i, j, 1, "")
+            elif value == "T":
+                for k in range(2, 5):
+                    if self.check_boat(i, j, k, "V", True):
+                        self.place_guaranteed_boat(i, j, k, "V")
+                        break
+            elif value == "L":
+                for k in range(2, 5):
+                    if self.check_boat(i, j, k, "H", True):
+                        self.place_guaranteed_boat(i, j, k, "H")
+                        break
+
+    def place_guaranteed_boat(self, row: int, col: int, size: int, direction: str):
+        """Coloca um barco formado na totalidade por hints, que depende apenas delas."""
+        body = self.geometry.boats[(row, col, size, direction)][4]
+        cause = self.because(body)
+        self.place_boat(row, col, size, direction)
+        self.cause = cause
 
     @staticmethod
     def parse_instance():
@@ -528,9 +1191,9 @@ class Board:
         com o output esperado, precisa receber uma lista das hints inicialmente
         fornecidas de modo a substituir nos locais adequados.
         """
-        display_board = [[" " for i in range(10)] for j in range(10)]
-        for i in range(10):
-            for j in range(10):
+        display_board = [[" " for i in range(self.size)] for j in range(self.size)]
+        for i in range(self.size):
+            for j in range(self.size):
                 display_board[i][j] = self.get_value(i, j)
 
         for hint in hints:
@@ -540,21 +1203,59 @@ class Board:
         print("\n".join(["".join(x) for x in display_board]))
 
         if advanced:
-            print("rows w/ hints:", self.rows_hints)
-            print("rows w/o hints:", self.rows_boats)
-            print("rows spaces:", self.row_spaces)
+            print("rows w/ hints:", self.rows_hints.tolist())
+            print("rows w/o hints:", self.rows_boats.tolist())
+            print("rows spaces:", self.row_spaces.tolist())
 
-            print("cols w/ hints:", self.cols_hints)
-            print("cols w/o hints:", self.cols_boats)
-            print("cols spaces:", self.col_spaces)
+            print("cols w/ hints:", self.cols_hints.tolist())
+            print("cols w/o hints:", self.cols_boats.tolist())
+            print("cols spaces:", self.col_spaces.tolist())
 
-            print("rem. positions:", self.remaining_positions)
-            print("rem. boats:", self.boats)
+            print("rem. positions:", bin(self.masks[" "]).count("1"))
+            print("rem. boats:", self.boats.tolist())
 
 
 class Bimaru(Problem):
-    def __init__(self, board: Board):
-        super().__init__(BimaruState(board))
+    # Estrategias de escolha do barco a colocar em cada estado (ver actions):
+    # "largest" o maior barco que falta, "fewest" o tamanho de barco com menos posições
+    # possiveis e "hint" a peça de barco ainda por cobrir com menos barcos que a cubram.
+    strategies = ["largest", "fewest", "hint"]
+
+    # Ordenações das posições possiveis: "hints" pelas peças que faltam na linha do barco
+    # (ver Board.check_positions_boat) e "slack" pela folga das linhas e colunas do barco.
+    orders = ["hints", "slack"]
+
+    # Limite dos valores de f das procuras informadas: o custo de um caminho mais h e o
+    # numero de barcos que faltavam na raiz, no maximo 10 (ver path_cost e h).
+    f_bound = sum(FLEET)
+
+    def __init__(
+        self,
+        board: Board,
+        strategy="largest",
+        order="hints",
+        symmetry=False,
+        rng=None,
+    ):
+        """Caso symmetry seja True, os barcos do mesmo tamanho sao colocados por ordem
+        crescente da sua primeira posição, evitando explorar as varias ordens pelas quais
+        se podem colocar os mesmos barcos. So e possivel com as estrategias que escolhem
+        o tamanho do barco ("largest" e "fewest").
+        Caso seja dado um gerador aleatorio (random.Random) em rng, as posições com o
+        mesmo numero de peças em falta na linha do barco ficam por ordem aleatoria, em
+        vez da ordem fixa de Board.check_positions_boat (ver restart_search)."""
+        if strategy not in Bimaru.strategies:
+            raise ValueError("Unknown branching strategy: " + str(strategy))
+        if order not in Bimaru.orders:
+            raise ValueError("Unknown value ordering: " + str(order))
+        if symmetry and strategy == "hint":
+            raise ValueError("Symmetry breaking needs a size based branching strategy")
+
+        super().__init__(BimaruState(board, symmetry))
+        self.strategy = strategy
+        self.order = order
+        self.symmetry = symmetry
+        self.rng = rng
 
     def actions(self, state: BimaruState):
         """Retorna uma lista de ações que podem ser executadas a
@@ -562,31 +1263,177 @@ class Bimaru(Problem):
         Formato de action: (x, y, tamanho, direçao), direcoes: 'V' ou 'H',
         caso tamanho = 1, nao importa direcao.
         (x, y) representa o topo ou esquerda do barco.
+        Todas as ações colocam o mesmo barco (escolhido de acordo com self.strategy), pelo
+        que basta explorar uma delas. As ações mais promissoras ficam no fim da lista,
+        que sao as primeiras a ser exploradas pela procura em profundidade.
+        """
+        board = state.board
+        if board.invalid:
+            return []
+
+        sizes = [k for k in range(4, 0, -1) if board.boats[k - 1] > 0]
+        if not sizes:
+            return []
+
+        if self.strategy == "largest":
+            positions = self.positions(board, sizes[0])
+        else:
+            options = [self.positions(board, k) for k in sizes]
+            positions = None
+            if self.strategy == "hint":
+                positions = self.hint_positions(board, sum(options, []))
+            if positions is None:
+                # Em caso de empate, fica o maior barco.
+                positions = min(options, key=len)
+
+        if self.order == "slack":
+            positions.sort(key=lambda action: -self.slack(board, action))
+
+        return positions
+
+    def positions(self, board: Board, size: int) -> list:
+        """Retorna as posições possiveis para um barco do tamanho dado, que, caso se
+        quebre a simetria, tem de ficar depois do ultimo barco desse tamanho colocado.
+        """
+        positions = board.check_positions_boat(size)
+
+        if self.rng is not None:
+            self.rng.shuffle(positions)
+            positions.sort(key=board.line_hints)
+
+        if self.symmetry:
+            last = board.last_boats[size - 1]
+            index = board.geometry.index
+            positions = [p for p in positions if index(p[0], p[1]) > last]
+
+        return positions
+
+    def hint_positions(self, board: Board, positions: list):
+        """Retorna as posições, de entre as dadas, que cobrem a peça de barco ainda por cobrir
+        (hint ou placeholder) com menos posições que a cubram, ou None caso nao haja nenhuma.
         """
-        for k in range(4, 0, -1):
-            if state.board.boats[k - 1] > 0:
-                return state.board.check_positions_boat(k)
+        return self.hint_cell(board, positions)[1]
+
+    def hint_cell(self, board: Board, positions: list):
+        """Retorna o indice da peça de barco escolhida por hint_positions e as posições
+        que a cobrem, ou (None, None) caso nao haja nenhuma."""
+        boats = board.geometry.boats
+        bodies = [boats[action][4] for action in positions]
+
+        cell, best = None, None
+        for index in iter_bits(board.pieces_mask() & ~board.placed_mask()):
+            bit = 1 << index
+            covering = [positions[i] for i in range(len(positions)) if bodies[i] & bit]
+
+            if best is None or len(covering) < len(best):
+                cell, best = index, covering
+                if not best:
+                    break
+
+        return cell, best
+
+    def slack(self, board: Board, action) -> int:
+        """Retorna a folga (espaços vazios que terão de ser agua) total das linhas e
+        colunas ocupadas pelo barco colocado por 'action'."""
+        row, col, size, direction = action
+        if direction == "V":
+            rows, cols = range(row, row + size), [col]
+        else:
+            rows, cols = [row], range(col, col + size)
 
-        return []
+        return sum(board.row_spaces[i] - board.rows_hints[i] for i in rows) + sum(
+            board.col_spaces[j] - board.cols_hints[j] for j in cols
+        )
 
     def result(self, state: BimaruState, action):
         """Retorna o estado resultante de executar a 'action' sobre
         'state' passado como argumento. A ação a executar deve ser uma
         das presentes na lista obtida pela execução de
-        self.actions(state)."""
-        old_board = copy.deepcopy(state.board)
-        new_state = BimaruState(old_board)
+        self.actions(state). Retorna None caso o tabuleiro resultante nao tenha solução.
+        """
+        new_state = BimaruState(state.board.copy(), state.symmetry)
 
-        new_state.board.place_boat(*action)
-        new_state.board.cleanup()
+        new_state.board.set_last_boat(*action[:3])
+        if not new_state.board.place_boat(*action) or not new_state.board.cleanup():
+            return None
 
+        # O novo estado nunca e desfeito, pelo que o trail so ocuparia memoria.
+        new_state.board.trail = []
         return new_state
 
+    def apply(self, state: BimaruState, action, level=None):
+        """Executa a 'action' diretamente sobre 'state' e retorna a marca do trail
+        que permite desfazê-la com self.undo. Caso o tabuleiro resultante nao tenha
+        solução, desfaz a ação e retorna None. Caso seja dado o nivel de decisão da
+        ação, o tabuleiro regista a causa de cada escrita (ver Board.track_causes)."""
+        mark = state.board.mark()
+        if level is not None:
+            if state.board.causes is None:
+                state.board.track_causes()
+            state.board.cause = 1 << level
+
+        state.board.set_last_boat(*action[:3])
+        if not state.board.place_boat(*action) or not state.board.cleanup():
+            state.board.undo(mark)
+            return None
+
+        return mark
+
+    def undo(self, state: BimaruState, mark):
+        """Desfaz todas as ações executadas sobre 'state' desde a marca dada."""
+        state.board.undo(mark)
+
+    def conflict(self, state: BimaruState) -> int:
+        """Retorna os niveis de decisão (mascara de bits) que explicam a ultima
+        contradição encontrada por apply."""
+        return state.board.conflict
+
+    def exclusions(self, state: BimaruState, actions) -> int:
+        """Retorna os niveis de decisão (mascara de bits) que explicam a falta, em
+        'actions', das restantes posições do barco escolhido por self.actions: as
+        posições do mesmo tamanho ou, com a estrategia "hint", as que cobrem a mesma peça.
+        """
+        board = state.board
+        if board.causes is None:
+            # Sem causas registadas, ainda nao ha decisões (a raiz nao tem ações).
+            return 0
+        if board.invalid:
+            return board.conflict
+
+        sizes = [k for k in range(4, 0, -1) if board.boats[k - 1] > 0]
+        if not sizes:
+            return -1
+
+        cell, conflict = None, 0
+        if self.strategy == "largest":
+            chosen = [sizes[0]]
+        else:
+            options = [self.positions(board, k) for k in sizes]
+            chosen = None
+            if self.strategy == "hint":
+                cell = self.hint_cell(board, sum(options, []))[0]
+            if cell is not None:
+                # A peça tem de ser coberta por um dos barcos que faltam.
+                chosen = sizes
+                conflict = board.causes[cell]
+                for k in range(1, 5):
+                    if k not in sizes:
+                        conflict |= board.fleet_cause(k)
+            else:
+                chosen = [min(zip(options, sizes), key=lambda o: len(o[0]))[1]]
+
+        placements = []
+        for k in chosen:
+            for placement in board.geometry.placements[k]:
+                if cell is None or placement[4] >> cell & 1:
+                    placements.append(placement)
+        return conflict | board.exclusions(placements, self.symmetry)
+
     def goal_test(self, state: BimaruState):
         """Retorna True se e só se o estado passado como argumento é
         um estado objetivo. Deve verificar se todas as posições do tabuleiro
         estão preenchidas de acordo com as regras do problema."""
-        if state.board.remaining_positions != 0:
+        if state.board.invalid or state.board.masks[" "] != 0:
             return False
 
         for x in state.board.rows_boats:
@@ -603,19 +1450,156 @@ class Bimaru(Problem):
 
         return True
 
+    def path_cost(self, c, state1: BimaruState, action, state2: BimaruState):
+        """O custo de um caminho e o numero de barcos colocados, incluindo os que a
+        propagação coloca (ver Board.place_guaranteed_boats). As procuras que alteram um
+        so estado (ver apply) passam-no antes e depois da ação, que conta como um barco.
+        """
+        if state1 is state2:
+            return c + 1
+        return c + sum(state1.board.boats) - sum(state2.board.boats)
+
     def h(self, node: Node):
-        """Função heuristica utilizada para a procura A*."""
-        return 20 - (
-            node.state.board.boats[0]
-            + node.state.board.boats[1] * 2
-            + node.state.board.boats[2] * 3
-            + node.state.board.boats[3] * 4
-        )
+        """Função heuristica utilizada para a procura A*: o numero de barcos que faltam,
+        ou infinito caso o tabuleiro nao possa ser completado (ver Board.completable).
+        Os barcos que faltam sao exatamente o custo que falta ate ao objetivo, pelo que
+        h e admissivel e as procuras informadas so exploram estados completaveis."""
+        board = node.state.board
+        if not board.completable():
+            return math.inf
+        return sum(board.boats)
 
 
 if __name__ == "__main__":
-    board, hints = Board.parse_instance()
-    problem = Bimaru(board)
+    parser = argparse.ArgumentParser(
+        description="Resolve uma instancia de Bimaru lida do stdin."
+    )
+    parser.add_argument("--strategy", choices=Bimaru.strategies, default="largest")
+    parser.add_argument("--order", choices=Bimaru.orders, default="hints")
+    parser.add_argument("--symmetry", action="store_true")
+    parser.add_argument(
+        "--backjump",
+        action="store_true",
+        help="retrocede diretamente ate a decisão que causou cada contradição",
+    )
+    parser.add_argument(
+        "--nogoods",
+        type=int,
+        default=1000,
+        help="numero maximo de conjuntos de barcos sem solução guardados com --backjump",
+    )
+    parser.add_argument(
+        "--restarts",
+        choices=["luby", "geometric"],
+        default=None,
+        help="recomeça a procura (com desempates aleatorios) com limites de nós crescentes",
+    )
+    parser.add_argument(
+        "--restart-base", type=int, default=100, help="limite de nós do 1º reinicio"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--discrepancies",
+        choices=["limited", "depth"],
+        default=None,
+        help="procura primeiro as soluções que menos se desviam da ordem das ações, "
+        "limitando o numero (limited) ou a profundidade (depth) dos desvios",
+    )
+    parser.add_argument("--max-nodes", type=int, default=None)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=None,
+        help="memoria maxima do processo (RSS), em MiB",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="ficheiro onde a procura com retrocesso guarda periodicamente o seu estado",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=60,
+        help="segundos entre checkpoints",
+    )
+    parser.add_argument(
+        "--resume",
+        default=None,
+        help="continua a procura guardada neste checkpoint (em vez de ler uma "
+        "instancia do stdin), que continua a ser atualizado",
+    )
+    args = parser.parse_args()
+    if (args.checkpoint or args.resume) and (
+        args.backjump
+        or args.restarts
+        or args.discrepancies
+        or args.max_nodes
+        or args.max_seconds
+        or args.max_memory
+    ):
+        parser.error("checkpoints are only supported by the plain backtracking search")
+
+    # Com --resume, o problema e as hints vem do checkpoint.
+    if not args.resume:
+        board, hints = Board.parse_instance()
+        problem = Bimaru(
+            board,
+            strategy=args.strategy,
+            order=args.order,
+            symmetry=args.symmetry,
+            rng=random.Random(args.seed) if args.restarts else None,
+        )
+
+    budget = None
+    if args.max_nodes or args.max_seconds or args.max_memory:
+        budget = Budget(
+            nodes=args.max_nodes,
+            seconds=args.max_seconds,
+            memory=args.max_memory and args.max_memory * 2**20,
+        )
 
-    res = depth_first_tree_search(problem)
+    # Com a quebra de simetria, o resultado depende da ordem dos barcos.
+    nogoods = 0 if args.symmetry else args.nogoods
+    if args.resume:
+        res, hints = resume_search(args.resume, args.checkpoint_interval)
+    elif args.restarts:
+        if args.restarts == "luby":
+            schedule = luby_schedule(args.restart_base)
+        else:
+            schedule = geometric_schedule(args.restart_base)
+        # Com --backjump, os nogoods aprendidos passam de um reinicio para o seguinte.
+        res = restart_search(
+            problem, schedule, nogoods if args.backjump else 0, budget=budget
+        )
+    elif args.discrepancies == "limited":
+        res = limited_discrepancy_search(problem, budget=budget)
+    elif args.discrepancies == "depth":
+        res = depth_bounded_discrepancy_search(problem, budget=budget)
+    elif args.backjump:
+        res = backjumping_search(problem, nogoods, budget=budget)
+    elif args.checkpoint:
+        # O checkpoint guarda as hints, para mostrar a solução depois de --resume.
+        res = checkpointed_search(
+            problem, args.checkpoint, args.checkpoint_interval, hints
+        )
+    else:
+        res = depth_first_backtracking_search(problem, budget=budget)
+
+    # Sem solução dentro do orçamento, mostra o tabuleiro mais completo a que chegou
+    # e sai com o estado 2, distinto de uma instância sem solução (estado 1).
+    if isinstance(res, BudgetExhausted):
+        print(
+            "Procura interrompida ({}): {} nós em {:.2f}s".format(
+                res.reason, res.nodes, res.seconds
+            ),
+            file=sys.stderr,
+        )
+        if res.deepest is not None:
+            res.deepest.state.board.display(hints=hints)
+        sys.exit(2)
+    if res is None:
+        print("Sem solução")
+        sys.exit(1)
     res.state.board.display(hints=hints)
@@ -0,0 +1,389 @@
+# bimarudlx.py: Resolve instancias de Bimaru como um problema de cobertura exata,
+# com Dancing Links (algoritmo C de Knuth, com cores), em alternativa a procura em
+# profundidade sobre o problema Bimaru de bimaruboats.py.
+#
+# Cada opção e uma das posições possiveis de um barco (ver Board.check_positions_boat)
+# depois da propagação inicial. Os itens primarios sao as peças de barco ainda por
+# cobrir (hints e "?"), que têm de ser cobertas por exatamente um barco, e os tipos de
+# barco que faltam, que têm de ser cobertos tantas vezes quantos os barcos em falta.
+# Os itens secundarios sao as posições vazias: o corpo de um barco pinta-as com a cor
+# do barco e a sua vizinhança com a cor da agua, pelo que dois barcos nao se podem
+# sobrepor nem tocar. As linhas e colunas sao tambem itens primarios, que têm de ser
+# cobertos tantas vezes quantas as peças de barco que lhes faltam (cada barco conta
+# com as suas peças nessa linha ou coluna).
+
+import sys
+import argparse
+
+from bimaruboats import Board, iter_bits
+
+# Cor da vizinhança dos barcos (as posições do corpo de cada opção têm cores proprias).
+WATER = 1
+
+
+class DancingLinks:
+    """Matriz esparsa de uma instancia de cobertura exata com cores (XCC), com as
+    operações do algoritmo C de Knuth: cover/uncover de um item e purify/unpurify de
+    um item secundario com uma dada cor, ambas desfeitas em O(1) por nó.
+
+    Os nós 1..n sao os cabeçalhos dos itens (primarios e depois secundarios), seguidos
+    dos nós das opções, separados por espaçadores (com top <= 0). Cada opção e uma lista
+    de pares (item, cor), em que a cor 0 indica um item sem cor."""
+
+    def __init__(self, primary, secondary, options):
+        self.names = [None] + list(primary) + list(secondary)
+        n1, n = len(primary), len(primary) + len(secondary)
+        index = {name: i for i, name in enumerate(self.names) if i}
+
+        # Listas circulares dos itens ativos: primarios a partir de 0 e secundarios a
+        # partir de n + 1.
+        self.llink, self.rlink = [0] * (n + 2), [0] * (n + 2)
+        for ring in [list(range(n1 + 1)), [n + 1] + list(range(n1 + 1, n + 1))]:
+            for a, b in zip(ring, ring[1:] + ring[:1]):
+                self.rlink[a], self.llink[b] = b, a
+        self.primary = n1
+
+        # Campos dos nós; nos cabeçalhos, length e o numero de opções ativas do item.
+        self.top = [0] * (n + 1)
+        self.ulink = list(range(n + 1))
+        self.dlink = list(range(n + 1))
+        self.color = [0] * (n + 1)
+        self.length = [0] * (n + 1)
+        self.option = [-1] * (n + 1)
+
+        # O espaçador antes de uma opção aponta (dlink) para o seu ultimo nó e o
+        # espaçador depois dela aponta (ulink) para o seu primeiro nó.
+        spacer = self.add_node(0, 0, -1)
+        for k, option in enumerate(options):
+            first = len(self.top)
+            for name, color in option:
+                i = index[name]
+                x = self.add_node(i, color, k)
+                self.ulink[x], self.dlink[x] = self.ulink[i], i
+                self.dlink[self.ulink[i]] = x
+                self.ulink[i] = x
+                self.length[i] += 1
+            self.dlink[spacer] = len(self.top) - 1
+            spacer = self.add_node(-(k + 1), 0, -1)
+            self.ulink[spacer] = first
+
+    def add_node(self, top: int, color: int, option: int) -> int:
+        """Acrescenta um nó (com os links a apontar para si proprio) e retorna-o."""
+        x = len(self.top)
+        self.top.append(top)
+        self.ulink.append(x)
+        self.dlink.append(x)
+        self.color.append(color)
+        self.option.append(option)
+        return x
+
+    def hide(self, p: int) -> None:
+        """Retira a opção do nó p das listas dos seus outros itens."""
+        top, ulink, dlink, color = self.top, self.ulink, self.dlink, self.color
+        q = p + 1
+        while q != p:
+            x, u, d = top[q], ulink[q], dlink[q]
+            if x <= 0:
+                q = u
+            else:
+                if color[q] >= 0:
+                    dlink[u], ulink[d] = d, u
+                    self.length[x] -= 1
+                q += 1
+
+    def unhide(self, p: int) -> None:
+        """Desfaz hide(p)."""
+        top, ulink, dlink, color = self.top, self.ulink, self.dlink, self.color
+        q = p - 1
+        while q != p:
+            x, u, d = top[q], ulink[q], dlink[q]
+            if x <= 0:
+                q = d
+            else:
+                if color[q] >= 0:
+                    dlink[u] = ulink[d] = q
+                    self.length[x] += 1
+                q -= 1
+
+    def cover(self, i: int) -> None:
+        """Retira o item i da lista de itens ativos e as suas opções das outras listas."""
+        p = self.dlink[i]
+        while p != i:
+            self.hide(p)
+            p = self.dlink[p]
+        l, r = self.llink[i], self.rlink[i]
+        self.rlink[l], self.llink[r] = r, l
+
+    def uncover(self, i: int) -> None:
+        """Desfaz cover(i)."""
+        l, r = self.llink[i], self.rlink[i]
+        self.rlink[l] = self.llink[r] = i
+        p = self.ulink[i]
+        while p != i:
+            self.unhide(p)
+            p = self.ulink[p]
+
+    def purify(self, i: int, c: int) -> None:
+        """Fixa a cor c do item secundario i: retira as opções que lhe dão outra cor e
+        marca (com cor -1) os nós que lhe dão a mesma."""
+        q = self.dlink[i]
+        while q != i:
+            if self.color[q] == c:
+                self.color[q] = -1
+            else:
+                self.hide(q)
+            q = self.dlink[q]
+
+    def unpurify(self, i: int, c: int) -> None:
+        """Desfaz purify(i, c)."""
+        q = self.ulink[i]
+        while q != i:
+            if self.color[q] < 0:
+                self.color[q] = c
+            else:
+                self.unhide(q)
+            q = self.ulink[q]
+
+    def hide_option(self, p: int) -> None:
+        """Retira a opção do nó p de todas as listas, incluindo a do item de p."""
+        self.dlink[self.ulink[p]], self.ulink[self.dlink[p]] = (
+            self.dlink[p],
+            self.ulink[p],
+        )
+        self.length[self.top[p]] -= 1
+        self.hide(p)
+
+    def unhide_option(self, p: int) -> None:
+        """Desfaz hide_option(p)."""
+        self.unhide(p)
+        self.dlink[self.ulink[p]] = self.ulink[self.dlink[p]] = p
+        self.length[self.top[p]] += 1
+
+
+class BimaruCover(DancingLinks):
+    """Instancia de cobertura exata correspondente a um tabuleiro de Bimaru (ver o
+    inicio do ficheiro). Os itens dos tipos de barco e das linhas e colunas têm
+    multiplicidade: cada opção desconta-lhes um barco, ou as suas peças nessa linha
+    ou coluna, e so sao cobertos quando ja nao falta nada."""
+
+    def __init__(self, board: Board):
+        self.board = board
+        geometry = board.geometry
+        pieces = board.pieces_mask() & ~board.placed_mask()
+        empty = board.masks[" "]
+
+        self.actions, options = [], []
+        fleet = [k for k in range(4, 0, -1) if board.boats[k - 1] > 0]
+        for k in fleet:
+            for action in board.check_positions_boat(k):
+                row, col, size, direction = action
+                placement = geometry.boats[action]
+                color = len(options) + WATER + 1
+                option = [(("boat", k), 0)]
+                if direction == "H":
+                    option += [(("row", row), 0)]
+                    option += [(("col", col + i), 0) for i in range(size)]
+                else:
+                    option += [(("col", col), 0)]
+                    option += [(("row", row + i), 0) for i in range(size)]
+                for index in iter_bits(placement[4]):
+                    if pieces >> index & 1:
+                        option.append((("piece", index), 0))
+                    else:
+                        option.append((("cell", index), color))
+                for index in iter_bits(placement[5] & empty):
+                    option.append((("cell", index), WATER))
+                self.actions.append(action)
+                options.append(option)
+
+        rows = [r for r in range(board.size) if board.rows_boats[r] > 0]
+        cols = [c for c in range(board.size) if board.cols_boats[c] > 0]
+        super().__init__(
+            [("boat", k) for k in fleet]
+            + [("row", r) for r in rows]
+            + [("col", c) for c in cols]
+            + [("piece", index) for index in iter_bits(pieces)],
+            [("cell", index) for index in iter_bits(empty)],
+            options,
+        )
+
+        # Quanto falta a cada item com multiplicidade: barcos de cada tamanho e peças
+        # de barco de cada linha e coluna.
+        self.remaining = {}
+        for i, name in enumerate(self.names[1 : self.primary + 1], 1):
+            if name[0] == "boat":
+                self.remaining[i] = board.boats[name[1] - 1]
+            elif name[0] == "row":
+                self.remaining[i] = board.rows_boats[name[1]]
+            elif name[0] == "col":
+                self.remaining[i] = board.cols_boats[name[1]]
+        self.fleet = set(range(1, len(fleet) + 1))
+
+        # Quanto cada nó desconta ao seu item: as peças do barco na linha ou coluna.
+        self.weight = [1] * len(self.top)
+        for x, i in enumerate(self.top):
+            if i > 0 and x > len(self.names) and self.names[i][0] in ["row", "col"]:
+                row, col, size, direction = self.actions[self.option[x]]
+                if (direction == "H") == (self.names[i][0] == "row"):
+                    self.weight[x] = size
+
+    def fits(self, p: int) -> bool:
+        """Verifica se a opção do nó p nao passa do que falta a cada item com
+        multiplicidade (em particular, as peças de barco da sua linha e colunas)."""
+        q = p + 1
+        while q != p:
+            if self.top[q] <= 0:
+                q = self.ulink[q]
+            else:
+                if self.remaining.get(self.top[q], 1) < self.weight[q]:
+                    return False
+                q += 1
+        return self.remaining.get(self.top[p], 1) >= self.weight[p]
+
+    def commit(self, p: int) -> None:
+        """Aplica o item do nó p de uma opção escolhida: desconta-o (cobrindo-o quando
+        ja nao falta nada) se tiver multiplicidade, cobre-o se for primario e fixa a sua
+        cor se for secundario."""
+        j = self.top[p]
+        if j in self.remaining:
+            self.remaining[j] -= self.weight[p]
+            if self.remaining[j] == 0:
+                self.cover(j)
+        elif self.color[p] == 0:
+            self.cover(j)
+        elif self.color[p] > 0:
+            self.purify(j, self.color[p])
+
+    def uncommit(self, p: int) -> None:
+        """Desfaz commit(p)."""
+        j = self.top[p]
+        if j in self.remaining:
+            if self.remaining[j] == 0:
+                self.uncover(j)
+            self.remaining[j] += self.weight[p]
+        elif self.color[p] == 0:
+            self.uncover(j)
+        elif self.color[p] > 0:
+            self.unpurify(j, self.color[p])
+
+    def choose(self, p: int) -> None:
+        """Aplica os outros itens da opção do nó p."""
+        q = p + 1
+        while q != p:
+            if self.top[q] <= 0:
+                q = self.ulink[q]
+            else:
+                self.commit(q)
+                q += 1
+
+    def unchoose(self, p: int) -> None:
+        """Desfaz choose(p)."""
+        q = p - 1
+        while q != p:
+            if self.top[q] <= 0:
+                q = self.dlink[q]
+            else:
+                self.uncommit(q)
+                q -= 1
+
+    def select(self):
+        """Escolhe o item primario ativo com menos alternativas (MRV). Para um tipo de
+        barco, as alternativas sao as opções que sobram depois de escolher os barcos
+        em falta. Retorna (item, alternativas)."""
+        best, best_score = None, None
+        i = self.rlink[0]
+        while i != 0:
+            score = self.length[i]
+            if i in self.fleet:
+                score -= self.remaining[i] - 1
+            if best_score is None or score < best_score:
+                best, best_score = i, score
+                if score <= 1:
+                    break
+            i = self.rlink[i]
+        return best, best_score
+
+    def search(self, solution) -> bool:
+        """Procura uma cobertura, acrescentando a solution as ações escolhidas. Retorna
+        True caso encontre uma solução."""
+        i, score = self.select()
+        if i is None:
+            return True
+        if score <= 0:
+            return False
+
+        if i in self.remaining:
+            return self.search_multiple(i, solution)
+
+        self.cover(i)
+        p = self.dlink[i]
+        while p != i:
+            if self.fits(p):
+                self.choose(p)
+                solution.append(self.actions[self.option[p]])
+                if self.search(solution):
+                    return True
+                solution.pop()
+                self.unchoose(p)
+            p = self.dlink[p]
+        self.uncover(i)
+        return False
+
+    def search_multiple(self, i: int, solution) -> bool:
+        """Procura escolhendo uma das opções do item i, que tem multiplicidade. Para nao
+        escolher as mesmas opções por ordens diferentes, cada opção tentada (ou que ja
+        nao cabe no que falta) e retirada enquanto se tentam as seguintes."""
+        tried = []
+        p = self.dlink[i]
+        while p != i:
+            fits = self.fits(p)
+            self.hide_option(p)
+            tried.append(p)
+            if fits:
+                self.remaining[i] -= self.weight[p]
+                if self.remaining[i] == 0:
+                    self.cover(i)
+                self.choose(p)
+                solution.append(self.actions[self.option[p]])
+                if self.search(solution):
+                    return True
+                solution.pop()
+                self.unchoose(p)
+                if self.remaining[i] == 0:
+                    self.uncover(i)
+                self.remaining[i] += self.weight[p]
+            p = self.dlink[p]
+
+        for p in reversed(tried):
+            self.unhide_option(p)
+        return False
+
+
+def solve(board: Board):
+    """Resolve o tabuleiro (ja propagado por Board.parse_instance) como um problema de
+    cobertura exata. Retorna as ações (barcos) que faltam colocar, ou None caso o
+    tabuleiro nao tenha solução."""
+    if board.invalid:
+        return None
+
+    solution = []
+    if not BimaruCover(board).search(solution):
+        return None
+    return solution
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resolve uma instancia de Bimaru lida do stdin com Dancing Links."
+    )
+    parser.parse_args()
+
+    board, hints = Board.parse_instance()
+    actions = solve(board)
+    if actions is None:
+        print("Sem solução")
+        sys.exit(1)
+    for action in actions:
+        board.place_boat(*action)
+    board.cleanup()
+    board.display(hints=hints)
@@ -0,0 +1,152 @@
+# bimarusat.py: Resolve instancias de Bimaru traduzindo-as para CNF e usando o solver
+# CDCL de sat.py, em alternativa a procura em profundidade sobre o problema Bimaru.
+#
+# Ha uma variavel por cada posição ainda por decidir (barco ou agua) e por cada posição
+# possivel dos barcos que faltam (ver Board.check_positions_boat), depois da propagação
+# inicial. Um barco implica as suas posições e agua a toda a volta; uma posição com
+# barco implica um dos barcos que a cobrem. O numero de peças de barco de cada linha
+# e coluna e o numero de barcos de cada tamanho sao restrições de cardinalidade,
+# codificadas com contadores sequenciais (Sinz, 2005), com as implicações nos dois
+# sentidos para impor o minimo e o maximo com o mesmo contador.
+
+import sys
+import argparse
+
+from bimaruboats import Board, iter_bits
+from sat import Solver
+
+
+def counter(solver: Solver, literals, k: int):
+    """Acrescenta ao solver um contador sequencial dos literais ate k: s[i][j] e
+    verdadeiro se e só se pelo menos j + 1 dos primeiros i + 1 literais o forem.
+    Retorna a ultima linha do contador (contagens de todos os literais)."""
+    previous = None
+    for i, x in enumerate(literals):
+        row = [solver.new_var() for j in range(k)]
+        for j, s in enumerate(row):
+            if previous is None:
+                # Um literal conta no maximo 1.
+                solver.add_clause([-s] if j > 0 else [-s, x])
+                if j == 0:
+                    solver.add_clause([-x, s])
+                continue
+
+            # s <=> previous[j] or (x and previous[j - 1])
+            solver.add_clause([-previous[j], s])
+            solver.add_clause([-s, previous[j], x])
+            if j == 0:
+                solver.add_clause([-x, s])
+            else:
+                solver.add_clause([-x, -previous[j - 1], s])
+                solver.add_clause([-s, previous[j], previous[j - 1]])
+        previous = row
+    return previous
+
+
+def exactly(solver: Solver, literals, k: int) -> None:
+    """Acrescenta ao solver as clausulas de "exatamente k dos literais sao verdadeiros"."""
+    n = len(literals)
+    if k < 0 or k > n:
+        solver.add_clause([])
+    elif k == 0 or k == n:
+        for x in literals:
+            solver.add_clause([x if k else -x])
+    else:
+        counts = counter(solver, literals, k + 1)
+        solver.add_clause([counts[k - 1]])
+        solver.add_clause([-counts[k]])
+
+
+class BimaruCNF:
+    """Tradução de um tabuleiro de Bimaru (ja propagado) para CNF."""
+
+    def __init__(self, board: Board):
+        self.board = board
+        self.solver = solver = Solver()
+        geometry = board.geometry
+
+        # Posições por decidir ou com peças de barco por cobrir (hints e "?").
+        pieces = board.pieces_mask() & ~board.placed_mask()
+        open_cells = board.masks[" "] | pieces
+        self.cells = {index: solver.new_var() for index in iter_bits(open_cells)}
+        for index in iter_bits(pieces):
+            solver.add_clause([self.cells[index]])
+
+        # Barcos possiveis de cada tamanho e barcos que cobrem cada posição.
+        self.boats = {}
+        covering = {index: [] for index in self.cells}
+        for k in range(1, 5):
+            boats = []
+            if board.boats[k - 1] > 0:
+                for action in board.check_positions_boat(k):
+                    boat = solver.new_var()
+                    self.boats[boat] = action
+                    boats.append(boat)
+
+                    placement = geometry.boats[action]
+                    for index in iter_bits(placement[4]):
+                        solver.add_clause([-boat, self.cells[index]])
+                        covering[index].append(boat)
+                    for index in iter_bits(placement[5] & open_cells):
+                        solver.add_clause([-boat, -self.cells[index]])
+            exactly(solver, boats, board.boats[k - 1])
+
+        for index, boats in covering.items():
+            solver.add_clause([-self.cells[index]] + boats)
+
+        for lines, counts in [
+            (geometry.row_indexes, board.rows_boats),
+            (geometry.col_indexes, board.cols_boats),
+        ]:
+            for line, count in zip(lines, counts):
+                exactly(solver, [self.cells[i] for i in line if i in self.cells], count)
+
+    def solve(self):
+        """Retorna as ações (barcos) que faltam colocar, ou None caso nao haja solução."""
+        if not self.solver.solve():
+            return None
+        return [
+            action for boat, action in self.boats.items() if self.solver.value(boat)
+        ]
+
+
+def solve(board: Board):
+    """Resolve o tabuleiro (ja propagado por Board.parse_instance) com o solver SAT.
+    Retorna as ações (barcos) que faltam colocar, ou None caso nao haja solução."""
+    if board.invalid:
+        return None
+    return BimaruCNF(board).solve()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resolve uma instancia de Bimaru lida do stdin com um solver SAT."
+    )
+    parser.add_argument(
+        "--stats", action="store_true", help="mostra as estatisticas do solver SAT"
+    )
+    args = parser.parse_args()
+
+    board, hints = Board.parse_instance()
+    cnf = BimaruCNF(board)
+    actions = cnf.solve()
+    if actions is None:
+        print("Sem solução")
+    else:
+        for action in actions:
+            board.place_boat(*action)
+        board.cleanup()
+        board.display(hints=hints)
+    if args.stats:
+        solver = cnf.solver
+        print(
+            "variaveis: {} clausulas: {} conflitos: {} decisões: {} reinicios: {}".format(
+                solver.variables,
+                len(solver.clauses),
+                solver.conflicts,
+                solver.decisions,
+                solver.restarts,
+            )
+        )
+    if actions is None:
+        sys.exit(1)
@@ -0,0 +1,345 @@
+# parallel.py: Procura em profundidade paralela para o Bimaru. Ha dois modos:
+# - parallel_search expande a raiz ate uma dada profundidade e explora as subarvores
+#   resultantes num conjunto de processos (concurrent.futures.ProcessPoolExecutor);
+# - work_stealing_search distribui o trabalho dinamicamente: cada processo faz a sua
+#   procura com retrocesso e os processos sem trabalho roubam os ramos por explorar
+#   mais antigos (mais proximos da raiz) dos processos ocupados.
+
+import os
+import sys
+import contextlib
+import time
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from bimaruboats import Board, BimaruState, Bimaru
+from search import Node, depth_first_backtracking_search
+from utils import print_table
+
+# Evento partilhado por todos os processos, ativado quando algum encontra uma solução.
+found = None
+
+
+def init_worker(event) -> None:
+    """Inicializa um processo do pool com o evento partilhado."""
+    global found
+    found = event
+
+
+class CancellableBimaru(Bimaru):
+    """Problema Bimaru cuja procura termina (deixa de haver ações) assim que o evento
+    dado e ativado, isto e, assim que outro processo encontra uma solução."""
+
+    def __init__(self, board: Board, event, **options):
+        super().__init__(board, **options)
+        self.event = event
+
+    def actions(self, state: BimaruState):
+        if self.event.is_set():
+            return []
+        return super().actions(state)
+
+
+def solve_subtree(board: Board, options: dict, searcher):
+    """Explora (num processo do pool) a subarvore com raiz no tabuleiro dado. Retorna
+    as ações do caminho ate a solução e o tabuleiro final, ou None caso a subarvore nao
+    tenha solução ou a procura tenha sido cancelada."""
+    node = searcher(CancellableBimaru(board, found, **options))
+    if node is None:
+        return None
+
+    found.set()
+    return [n.action for n in node.path()[1:]], node.state.board
+
+
+def extend_path(problem: Bimaru, node: Node, actions, solution: Board) -> Node:
+    """Retorna o nó objetivo que se obtem executando as ações dadas a partir de node
+    (noutro processo, que devolveu o tabuleiro final). Os nós acrescentados partilham
+    o estado final, como em depth_first_backtracking_search."""
+    state = BimaruState(solution, problem.symmetry)
+    for action in actions:
+        node = Node(
+            state,
+            node,
+            action,
+            problem.path_cost(node.path_cost, node.state, action, state),
+        )
+    return node
+
+
+def split(problem: Bimaru, depth: int):
+    """Expande a raiz do problema ate a profundidade dada. Retorna os nós dessa
+    profundidade, pela ordem em que a procura em profundidade os visitaria, e o
+    primeiro nó objetivo encontrado pelo caminho (ou None)."""
+    frontier = [Node(problem.initial)]
+    for i in range(depth):
+        children = []
+        for node in frontier:
+            if problem.goal_test(node.state):
+                return [], node
+            children.extend(node.expand(problem))
+        frontier = children
+
+    # A procura em profundidade explora primeiro o ultimo filho de cada nó.
+    return frontier[::-1], None
+
+
+def parallel_search(
+    board: Board,
+    split_depth=2,
+    workers=None,
+    searcher=depth_first_backtracking_search,
+    **options
+):
+    """Resolve o tabuleiro dado, expandindo a raiz ate split_depth e explorando as
+    subarvores com 'searcher' em (no maximo) 'workers' processos. As restantes opções
+    sao passadas a Bimaru. Retorna o nó objetivo da primeira subarvore a encontrar uma
+    solução, cancelando as restantes, ou None caso nao haja solução."""
+    problem = Bimaru(board, **options)
+    frontier, goal = split(problem, split_depth)
+    if goal is not None or not frontier:
+        return goal
+
+    event = multiprocessing.Event()
+    with ProcessPoolExecutor(
+        workers, initializer=init_worker, initargs=(event,)
+    ) as executor:
+        tasks = {
+            executor.submit(solve_subtree, node.state.board, options, searcher): node
+            for node in frontier
+        }
+        pending = set(tasks)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is None:
+                    continue
+
+                # Os processos a meio de uma subarvore param ao ver o evento.
+                event.set()
+                for other in pending:
+                    other.cancel()
+
+                actions, solution = result
+                return extend_path(problem, tasks[task], actions, solution)
+
+    return None
+
+
+def replay(problem: Bimaru, board: Board, actions):
+    """Executa as ações dadas sobre uma copia do tabuleiro. Retorna o estado
+    resultante, ou None caso alguma das ações leve a um tabuleiro sem solução."""
+    state = BimaruState(board.copy(), problem.symmetry)
+    for action in actions:
+        if problem.apply(state, action) is None:
+            return None
+    return state
+
+
+def steal_worker(me, board, options, inbox, outbox, requests, stop) -> None:
+    """Ciclo de um processo do work_stealing_search. Cada tarefa recebida em inbox e a
+    lista de ações que leva da raiz ao ramo a explorar (None termina o processo).
+
+    A procura com retrocesso guarda, para cada nivel, as ações ainda por explorar.
+    Quando requests[me] indica um ladrão, o processo dá-lhe o ramo por explorar mais
+    antigo (o do nivel mais baixo que a procura exploraria por ultimo). Todas as
+    mensagens para o coordenador seguem por outbox."""
+    problem = Bimaru(board, **options)
+    busy, nodes, tasks, donated = 0.0, 0, 0, 0
+
+    def explore(prefix):
+        """Procura em profundidade a partir do ramo prefix. Retorna as ações ate a
+        solução, ou None caso o ramo nao tenha solução (ou a procura seja parada)."""
+        nonlocal nodes, donated
+        state = replay(problem, board, prefix)
+        if state is None:
+            return None
+        if problem.goal_test(state):
+            return prefix, state
+
+        # levels[i] tem as ações por explorar no estado a que se chega com path[:i].
+        levels, marks, path = [list(problem.actions(state))], [], []
+        while levels:
+            if stop.value:
+                return None
+
+            thief = requests[me] - 1
+            if thief >= 0:
+                # Limpo antes da resposta, para não apagar um pedido que chegue depois.
+                requests[me] = 0
+                level = next((i for i, rest in enumerate(levels) if rest), None)
+                if level is None or (level == len(levels) - 1 and len(levels[-1]) == 1):
+                    outbox.put(("refuse", me, thief))
+                else:
+                    branch = prefix + path[:level] + [levels[level].pop(0)]
+                    outbox.put(("task", me, thief, branch))
+                    donated += 1
+
+            if not levels[-1]:
+                levels.pop()
+                if marks:
+                    problem.undo(state, marks.pop())
+                    path.pop()
+                continue
+
+            action = levels[-1].pop()
+            mark = problem.apply(state, action)
+            if mark is None:
+                continue
+            nodes += 1
+            marks.append(mark)
+            path.append(action)
+            if problem.goal_test(state):
+                return prefix + path, state
+            levels.append(list(problem.actions(state)))
+
+        return None
+
+    while True:
+        prefix = inbox.get()
+        if prefix is None:
+            break
+
+        tasks += 1
+        start = time.perf_counter()
+        result = explore(prefix)
+        busy += time.perf_counter() - start
+
+        if result is not None:
+            actions, state = result
+            outbox.put(("goal", me, actions, state.board))
+        else:
+            outbox.put(("idle", me))
+
+    outbox.put(("stats", me, busy, nodes, tasks, donated))
+
+
+def work_stealing_search(board: Board, workers=None, report=False, **options):
+    """Resolve o tabuleiro dado com 'workers' processos (por omissão, um por CPU) que
+    partilham o trabalho por roubo de ramos. As restantes opções sao passadas a Bimaru.
+    Retorna o nó objetivo encontrado, ou None caso nao haja solução. Se report for
+    True, mostra a utilização de cada processo (tempo ocupado sobre o tempo total).
+
+    O processo principal coordena: começa por dar a raiz a um dos processos e, sempre
+    que um processo fica sem trabalho, pede a um processo ocupado (de forma rotativa)
+    que lhe dê um ramo. A procura termina quando um processo encontra uma solução ou
+    quando nenhum processo tem trabalho nem ha pedidos pendentes."""
+    workers = workers or os.cpu_count() or 1
+    problem = Bimaru(board, **options)
+
+    outbox = multiprocessing.Queue()
+    inboxes = [multiprocessing.Queue() for i in range(workers)]
+    requests = multiprocessing.Array("i", workers, lock=False)
+    stop = multiprocessing.Value("b", 0, lock=False)
+    processes = [
+        multiprocessing.Process(
+            target=steal_worker,
+            args=(i, board, options, inboxes[i], outbox, requests, stop),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    start = time.perf_counter()
+    busy, idle, asked = {0}, deque(range(1, workers)), {}  # asked: vitima -> ladrão
+    inboxes[0].put([])
+    victim, goal = 0, None
+    while busy:
+        # Cada processo ocupado atende um pedido de cada vez.
+        while idle and len(asked) < len(busy):
+            candidates = sorted(w for w in busy if w not in asked)
+            victim = next((w for w in candidates if w > victim), candidates[0])
+            thief = idle.popleft()
+            asked[victim] = thief
+            requests[victim] = thief + 1
+
+        message = outbox.get()
+        if message[0] == "goal":
+            goal = message
+            break
+        elif message[0] == "task":
+            _, worker, thief, branch = message
+            del asked[worker]
+            busy.add(thief)
+            inboxes[thief].put(branch)
+        elif message[0] == "refuse":
+            _, worker, thief = message
+            del asked[worker]
+            idle.append(thief)
+        elif message[0] == "idle":
+            _, worker = message
+            busy.discard(worker)
+            idle.append(worker)
+            # O processo terminou sem ver o pedido que lhe foi feito.
+            if worker in asked:
+                requests[worker] = 0
+                idle.append(asked.pop(worker))
+    elapsed = time.perf_counter() - start
+
+    stop.value = 1
+    for inbox in inboxes:
+        inbox.put(None)
+    stats = {}
+    while len(stats) < workers:
+        message = outbox.get()
+        if message[0] == "stats":
+            stats[message[1]] = message[2:]
+    for process in processes:
+        process.join()
+
+    if report:
+        table = [
+            [i, "{:.0%}".format(busy / elapsed), nodes, tasks, donated]
+            for i, (busy, nodes, tasks, donated) in sorted(stats.items())
+        ]
+        # No stderr, para o stdout ter apenas a solução.
+        with contextlib.redirect_stdout(sys.stderr):
+            print_table(
+                table, ["Processo", "Utilização", "Nós", "Tarefas", "Ramos dados"]
+            )
+
+    if goal is None:
+        return None
+
+    _, worker, actions, solution = goal
+    return extend_path(problem, Node(problem.initial), actions, solution)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resolve uma instancia de Bimaru lida do stdin, em paralelo."
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--split-depth", type=int, default=2)
+    parser.add_argument(
+        "--steal",
+        action="store_true",
+        help="distribui o trabalho por roubo de ramos em vez de dividir a raiz",
+    )
+    parser.add_argument(
+        "--report", action="store_true", help="mostra a utilização de cada processo"
+    )
+    parser.add_argument("--strategy", choices=Bimaru.strategies, default="largest")
+    parser.add_argument("--order", choices=Bimaru.orders, default="hints")
+    parser.add_argument("--symmetry", action="store_true")
+    args = parser.parse_args()
+
+    board, hints = Board.parse_instance()
+    options = dict(strategy=args.strategy, order=args.order, symmetry=args.symmetry)
+    if args.steal:
+        res = work_stealing_search(
+            board, workers=args.workers, report=args.report, **options
+        )
+    else:
+        res = parallel_search(
+            board, split_depth=args.split_depth, workers=args.workers, **options
+        )
+    if res is None:
+        print("Sem solução")
+        sys.exit(1)
+    res.state.board.display(hints=hints)
@@ -0,0 +1,214 @@
+# portfolio.py: Resolve uma instancia de Bimaru com um portfolio de configurações
+# (algoritmo de procura e opções de Bimaru), corridas em paralelo em processos
+# separados. A primeira solução encontrada e devolvida e os restantes processos sao
+# terminados. Opcionalmente, as corridas, vitorias e tempos de cada configuração sao
+# registados num ficheiro JSON, agrupados por caracteristicas das instancias, e as
+# configurações que correm sao escolhidas pelo criterio UCB1: as que mais ganham em
+# instancias semelhantes, sem deixar de experimentar as que correram menos vezes.
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import multiprocessing
+
+from bimaruboats import Board, Bimaru
+from parallel import extend_path
+from search import (
+    Node,
+    astar_search,
+    greedy_search,
+    depth_first_tree_search,
+    depth_first_backtracking_search,
+)
+
+# Algoritmos de procura disponiveis, pelo nome (as configurações sao guardadas em JSON).
+SEARCHERS = {
+    "backtracking": depth_first_backtracking_search,
+    "depth_first": depth_first_tree_search,
+    "greedy": greedy_search,
+    "astar": astar_search,
+}
+
+# Configurações do portfolio (algoritmo, opções de Bimaru), pela ordem em que correm
+# quando nao ha estatisticas.
+CONFIGURATIONS = [
+    ("backtracking", {"strategy": "largest"}),
+    ("backtracking", {"strategy": "fewest", "order": "slack", "symmetry": True}),
+    ("backtracking", {"strategy": "hint"}),
+    ("depth_first", {"strategy": "fewest"}),
+    ("greedy", {"strategy": "largest", "symmetry": True}),
+    ("astar", {"strategy": "fewest", "symmetry": True}),
+]
+
+
+def name(configuration) -> str:
+    """Devolve o nome de uma configuração, usado nas estatisticas."""
+    searcher, options = configuration
+    return " ".join(
+        [searcher]
+        + [key if value is True else str(value) for key, value in options.items()]
+    )
+
+
+def features(board: Board, hints) -> str:
+    """Devolve o grupo de instancias a que o tabuleiro pertence, de acordo com o numero
+    de hints e de posições por decidir depois da propagação inicial."""
+    empty = bin(board.masks[" "]).count("1")
+    return "{} hints, {} vazias".format(min(len(hints), 10), empty // 10 * 10)
+
+
+def load_stats(path: str) -> dict:
+    """Lê as estatisticas (grupo -> configuração -> {"runs", "wins", "time"}) do
+    ficheiro dado: quantas vezes a configuração correu, quantas vezes ganhou e o tempo
+    total (em segundos) das vitorias. Os ficheiros antigos, so com o numero de
+    vitorias de cada configuração, contam cada vitoria como uma corrida."""
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        stats = json.load(file)
+
+    for bucket in stats.values():
+        for key, value in bucket.items():
+            if isinstance(value, int):
+                bucket[key] = {"runs": value, "wins": value, "time": 0.0}
+    return stats
+
+
+def save_stats(path: str, stats: dict) -> None:
+    """Escreve as estatisticas no ficheiro dado, substituindo-o de forma atomica."""
+    with open(path + ".tmp", "w") as file:
+        json.dump(stats, file, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def score(record: dict, total: int) -> float:
+    """Pontuação UCB1 de uma configuração, dadas as suas estatisticas num grupo e o
+    total de corridas do grupo: a fração de vitorias mais um bonus que diminui com o
+    numero de corridas. As configurações que nunca correram vem primeiro."""
+    if not record or not record["runs"]:
+        return math.inf
+    rate = record["wins"] / record["runs"]
+    return rate + math.sqrt(2 * math.log(max(total, 1)) / record["runs"])
+
+
+def rank(configurations, records: dict, workers: int):
+    """Escolhe as 'workers' configurações a correr, pela ordem em que correm: as de
+    maior pontuação (ver score), desempatando pelo menor tempo medio das vitorias e
+    mantendo a ordem dada entre as restantes. Com pelo menos dois processos, o ultimo
+    fica sempre com a configuração (de entre as que sobram) que correu menos vezes."""
+    total = sum(record["runs"] for record in records.values())
+
+    def key(configuration):
+        record = records.get(name(configuration))
+        mean = record["time"] / record["wins"] if record and record["wins"] else 0.0
+        return -score(record, total), mean
+
+    ranked = sorted(configurations, key=key)
+    if workers < 2 or len(ranked) <= workers:
+        return ranked[:workers]
+
+    rest = ranked[workers - 1 :]
+    least = min(rest, key=lambda c: records.get(name(c), {"runs": 0})["runs"])
+    return ranked[: workers - 1] + [least]
+
+
+def run_configuration(i, board: Board, configuration, results) -> None:
+    """Resolve o tabuleiro com a configuração dada (num processo separado) e envia para
+    results o indice da configuração, as ações ate a solução e o tabuleiro final (ou
+    None, None caso nao haja solução)."""
+    searcher, options = configuration
+    node = None
+    try:
+        node = SEARCHERS[searcher](Bimaru(board, **options))
+    finally:
+        if node is None:
+            results.put((i, None, None))
+        else:
+            results.put((i, [n.action for n in node.path()[1:]], node.state.board))
+
+
+def portfolio_search(
+    board: Board, hints=[], configurations=CONFIGURATIONS, workers=None, stats=None
+):
+    """Resolve o tabuleiro correndo ate 'workers' configurações em paralelo (por
+    omissão, uma por CPU, e pelo menos duas). Caso seja dado o caminho de um ficheiro
+    de estatisticas, as configurações correm por ordem de vitorias em instancias do
+    mesmo grupo (ver features e rank) e, no fim, e registada uma corrida de cada
+    configuração e a vitoria e o tempo da vencedora. Retorna o nó objetivo e o nome
+    da configuração vencedora, ou (None, None) caso nao haja solução."""
+    workers = workers or max(os.cpu_count() or 1, 2)
+    bucket = features(board, hints)
+    history = load_stats(stats)
+    configurations = rank(configurations, history.get(bucket, {}), workers)
+    start = time.perf_counter()
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=run_configuration,
+            args=(i, board, configuration, results),
+            daemon=True,
+        )
+        for i, configuration in enumerate(configurations)
+    ]
+    for process in processes:
+        process.start()
+
+    goal, winner = None, None
+    for i in range(len(processes)):
+        j, actions, solution = results.get()
+        if solution is not None:
+            elapsed = time.perf_counter() - start
+            winner = configurations[j]
+            problem = Bimaru(board, **winner[1])
+            goal = extend_path(problem, Node(problem.initial), actions, solution)
+            break
+
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+    if winner is None:
+        return None, None
+
+    if stats is not None:
+        records = history.setdefault(bucket, {})
+        for configuration in configurations:
+            record = records.setdefault(
+                name(configuration), {"runs": 0, "wins": 0, "time": 0.0}
+            )
+            record["runs"] += 1
+        records[name(winner)]["wins"] += 1
+        records[name(winner)]["time"] += elapsed
+        save_stats(stats, history)
+
+    return goal, name(winner)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Resolve uma instancia de Bimaru lida do stdin com um portfolio de configurações."
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--stats",
+        default=None,
+        help="ficheiro JSON com as corridas, vitorias e tempos de cada configuração",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="mostra a configuração vencedora"
+    )
+    args = parser.parse_args()
+
+    board, hints = Board.parse_instance()
+    res, winner = portfolio_search(board, hints, workers=args.workers, stats=args.stats)
+    if res is None:
+        print("Sem solução")
+        sys.exit(1)
+    res.state.board.display(hints=hints)
+    if args.verbose:
+        print("Vencedora:", winner)
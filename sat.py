@@ -0,0 +1,251 @@
+# sat.py: Solver SAT CDCL (conflict-driven clause learning) em Python puro, com
+# literais vigiados, escolha de variaveis VSIDS, aprendizagem de clausulas pelo
+# primeiro ponto de implicação unico (1UIP), reinicios segundo a sequencia de Luby
+# e memoria da ultima fase de cada variavel.
+#
+# As variaveis sao inteiros a partir de 1 e os literais seguem o formato DIMACS:
+# v para a variavel verdadeira e -v para a variavel falsa.
+
+import heapq
+
+from utils import luby
+
+
+class Solver:
+    """Solver CDCL. As clausulas sao acrescentadas com add_clause (antes de solve) e
+    o modelo encontrado e consultado com value.
+
+    Internamente, o literal v corresponde ao indice 2v e o literal -v ao indice 2v+1,
+    e value_of[indice] e 1 (verdadeiro), -1 (falso) ou 0 (por atribuir). Cada clausula
+    vigia os seus dois primeiros literais: so e revista quando um deles fica falso."""
+
+    # Numero de conflitos do primeiro reinicio (multiplicado pela sequencia de Luby) e
+    # fator de decaimento das atividades das variaveis.
+    restart_base = 100
+    decay = 0.95
+
+    def __init__(self):
+        self.variables = 0
+        self.clauses = []  # listas de indices de literais
+        self.watches = [[], []]  # indice de literal -> clausulas que o vigiam
+        self.value_of = [0, 0]
+        self.level = [0]  # variavel -> nivel de decisão
+        self.reason = [None]  # variavel -> clausula que a implicou
+        self.activity = [0.0]
+        self.phase = [False]  # ultima fase de cada variavel
+        self.heap = []  # (-atividade, variavel), com entradas antigas ignoradas
+        self.increment = 1.0
+        self.trail, self.trail_lim, self.head = [], [], 0
+        self.unsatisfiable = False
+        self.conflicts = self.decisions = self.propagations = self.restarts = 0
+
+    def new_var(self) -> int:
+        """Cria uma nova variavel e retorna-a."""
+        self.variables += 1
+        self.watches += [[], []]
+        self.value_of += [0, 0]
+        self.level.append(0)
+        self.reason.append(None)
+        self.activity.append(0.0)
+        self.phase.append(False)
+        heapq.heappush(self.heap, (0.0, self.variables))
+        return self.variables
+
+    @staticmethod
+    def index(literal: int) -> int:
+        return 2 * literal if literal > 0 else -2 * literal + 1
+
+    def value(self, variable: int) -> bool:
+        """Valor da variavel no modelo encontrado (False caso nao tenha sido atribuida)."""
+        return self.value_of[2 * variable] == 1
+
+    def add_clause(self, literals) -> bool:
+        """Acrescenta uma clausula (lista de literais). Retorna False caso o problema
+        fique trivialmente impossivel."""
+        if self.unsatisfiable:
+            return False
+        clause = []
+        for literal in dict.fromkeys(self.index(l) for l in literals):
+            if literal ^ 1 in clause or self.value_of[literal] == 1:
+                return True  # tautologia ou ja satisfeita
+            if self.value_of[literal] == 0:
+                clause.append(literal)
+
+        if not clause:
+            self.unsatisfiable = True
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+            self.unsatisfiable = self.propagate() is not None
+        else:
+            self.attach(clause)
+        return not self.unsatisfiable
+
+    def attach(self, clause) -> None:
+        self.clauses.append(clause)
+        self.watches[clause[0]].append(clause)
+        self.watches[clause[1]].append(clause)
+
+    def assign(self, literal: int, reason) -> None:
+        variable = literal >> 1
+        self.value_of[literal] = 1
+        self.value_of[literal ^ 1] = -1
+        self.level[variable] = len(self.trail_lim)
+        self.reason[variable] = reason
+        self.trail.append(literal)
+
+    def propagate(self):
+        """Propaga as atribuições do trail ainda por rever. Retorna a clausula em
+        conflito, ou None."""
+        value_of, watches = self.value_of, self.watches
+        while self.head < len(self.trail):
+            false = self.trail[self.head] ^ 1
+            self.head += 1
+            self.propagations += 1
+
+            watching = watches[false]
+            i = j = 0
+            while i < len(watching):
+                clause = watching[i]
+                i += 1
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                first = clause[0]
+                if value_of[first] == 1:
+                    watching[j] = clause
+                    j += 1
+                    continue
+
+                # Procura outro literal (nao falso) para vigiar.
+                for k in range(2, len(clause)):
+                    if value_of[clause[k]] != -1:
+                        clause[1], clause[k] = clause[k], false
+                        watches[clause[1]].append(clause)
+                        break
+                else:
+                    watching[j] = clause
+                    j += 1
+                    if value_of[first] == -1:
+                        # Conflito: mantem as restantes clausulas a vigiar este literal.
+                        while i < len(watching):
+                            watching[j] = watching[i]
+                            i += 1
+                            j += 1
+                        del watching[j:]
+                        return clause
+                    self.assign(first, clause)
+            del watching[j:]
+        return None
+
+    def bump(self, variable: int) -> None:
+        """Aumenta a atividade (VSIDS) de uma variavel envolvida num conflito."""
+        self.activity[variable] += self.increment
+        if self.activity[variable] > 1e100:
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.increment *= 1e-100
+            self.heap = [(-self.activity[v], v) for v in range(1, self.variables + 1)]
+            heapq.heapify(self.heap)
+        heapq.heappush(self.heap, (-self.activity[variable], variable))
+
+    def analyze(self, conflict):
+        """Deriva do conflito a clausula aprendida pelo primeiro ponto de implicação
+        unico. Retorna a clausula (com o literal afirmado a frente) e o nivel para onde
+        retroceder."""
+        seen = set()
+        learnt = [None]
+        pending = 0
+        level = len(self.trail_lim)
+        index = len(self.trail) - 1
+        clause, literal = conflict, None
+
+        while True:
+            for other in clause:
+                if other == literal:
+                    continue
+                variable = other >> 1
+                if variable not in seen and self.level[variable] > 0:
+                    seen.add(variable)
+                    self.bump(variable)
+                    if self.level[variable] == level:
+                        pending += 1
+                    else:
+                        learnt.append(other)
+
+            # Proximo literal do nivel atual no trail que participa no conflito.
+            while self.trail[index] >> 1 not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self.reason[literal >> 1]
+
+        learnt[0] = literal ^ 1
+        if len(learnt) == 1:
+            return learnt, 0
+
+        # O segundo literal vigiado e o do nivel mais alto, para onde se retrocede.
+        k = max(range(1, len(learnt)), key=lambda k: self.level[learnt[k] >> 1])
+        learnt[1], learnt[k] = learnt[k], learnt[1]
+        return learnt, self.level[learnt[1] >> 1]
+
+    def backtrack(self, level: int) -> None:
+        """Desfaz as atribuições dos niveis acima do dado, guardando a sua fase."""
+        if len(self.trail_lim) <= level:
+            return
+        for literal in self.trail[self.trail_lim[level] :]:
+            variable = literal >> 1
+            self.phase[variable] = not literal & 1
+            self.value_of[literal] = self.value_of[literal ^ 1] = 0
+            self.reason[variable] = None
+            heapq.heappush(self.heap, (-self.activity[variable], variable))
+        del self.trail[self.trail_lim[level] :]
+        del self.trail_lim[level:]
+        self.head = len(self.trail)
+
+    def decide(self) -> bool:
+        """Atribui a variavel por atribuir com maior atividade, na sua ultima fase.
+        Retorna False caso todas as variaveis estejam atribuidas."""
+        while self.heap:
+            activity, variable = heapq.heappop(self.heap)
+            if (
+                self.value_of[2 * variable] == 0
+                and -activity == self.activity[variable]
+            ):
+                self.decisions += 1
+                self.trail_lim.append(len(self.trail))
+                self.assign(2 * variable + (not self.phase[variable]), None)
+                return True
+        return False
+
+    def solve(self) -> bool:
+        """Procura um modelo das clausulas. Retorna True caso exista (ver value)."""
+        if self.unsatisfiable or self.propagate() is not None:
+            self.unsatisfiable = True
+            return False
+
+        restart, budget = 1, self.restart_base * luby(1)
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                budget -= 1
+                if not self.trail_lim:
+                    self.unsatisfiable = True
+                    return False
+
+                learnt, level = self.analyze(conflict)
+                self.backtrack(level)
+                if len(learnt) == 1:
+                    self.assign(learnt[0], None)
+                else:
+                    self.attach(learnt)
+                    self.assign(learnt[0], learnt)
+                self.increment /= self.decay
+            elif budget <= 0:
+                self.restarts += 1
+                restart += 1
+                budget = self.restart_base * luby(restart)
+                self.backtrack(0)
+            elif not self.decide():
+                return True
@@ -6,11 +6,21 @@ then create problem instances and solve them with calls to the various search
 functions.
 """
 
+import os
 import sys
+import copy
+import gzip
+import time
+import pickle
 from collections import deque
 
 from utils import *
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
 
 class Problem:
     """The abstract class for a formal problem. You should subclass
@@ -75,6 +85,9 @@ class Node:
     an explanation of how the f and h values are handled. You will not need to
     subclass this class."""
 
+    # f and h are only set by the searches that use them (see memoize).
+    __slots__ = ("state", "parent", "action", "path_cost", "depth", "f", "h")
+
     def __init__(self, state, parent=None, action=None, path_cost=0):
         """Create a search tree Node, derived from a parent by an action."""
         self.state = state
@@ -92,14 +105,33 @@ class Node:
         return self.state < node.state
 
     def expand(self, problem):
-        """List the nodes reachable in one step from this node."""
-        return [
+        """List the nodes reachable in one step from this node.
+        Actions that lead to a dead end (see child_node) are left out."""
+        children = [
             self.child_node(problem, action) for action in problem.actions(self.state)
         ]
+        return [child for child in children if child is not None]
+
+    def iter_expand(self, problem, reverse=False):
+        """Yield the nodes reachable in one step from this node, building
+        each child only when it is requested. If reverse is True, the
+        children are yielded in the reverse order of problem.actions.
+        Actions that lead to a dead end (see child_node) are left out."""
+        actions = problem.actions(self.state)
+        if reverse:
+            actions = reversed(list(actions))
+        for action in actions:
+            child = self.child_node(problem, action)
+            if child is not None:
+                yield child
 
     def child_node(self, problem, action):
-        """[Figure 3.10]"""
+        """[Figure 3.10]
+        Returns None if problem.result returns None, which a problem may do
+        to report that the action leads to a state with no solution."""
         next_state = problem.result(self.state, action)
+        if next_state is None:
+            return None
         next_node = Node(
             next_state,
             self,
@@ -177,49 +209,493 @@ class SimpleProblemSolvingAgentProgram:
         raise NotImplementedError
 
 
+# ______________________________________________________________________________
+# Budgets
+
+
+class Budget:
+    """Limits on the work of a search, any of which may be None (no limit):
+    at most 'nodes' nodes visited, 'seconds' of wall time since the budget
+    was created, a peak resident memory (RSS) of the process of 'memory'
+    bytes, and a cancellation token 'cancel', which is anything with an
+    is_set() method (such as threading.Event or multiprocessing.Event).
+    The searchers that take a budget count every node they visit with spend,
+    stop as soon as it returns True and then return budget.exhausted().
+    The clock, memory and token are only checked every 'every' nodes.
+    A budget may be shared by several searches, one after the other."""
+
+    def __init__(self, nodes=None, seconds=None, memory=None, cancel=None, every=64):
+        self.nodes = nodes
+        self.seconds = seconds
+        self.memory = memory
+        self.cancel = cancel
+        self.every = every
+        self.start = time.monotonic()
+        self.visited = 0
+        self.deepest = None
+        self.reason = None  # 'nodes', 'time', 'memory' or 'cancelled', once spent
+
+    def spend(self, depth, node):
+        """Count a node visited at the given depth. node is the Node itself or,
+        for searchers that change a single state in place, a function that
+        builds it, called only if the node is the deepest so far.
+        Return True if the budget is exhausted."""
+        if self.reason is not None:
+            return True
+        self.visited += 1
+        if self.deepest is None or depth > self.deepest.depth:
+            self.deepest = node if isinstance(node, Node) else node()
+        if self.nodes is not None and self.visited >= self.nodes:
+            self.reason = "nodes"
+        elif self.visited % self.every == 0:
+            if self.cancel is not None and self.cancel.is_set():
+                self.reason = "cancelled"
+            elif self.seconds is not None and self.elapsed() >= self.seconds:
+                self.reason = "time"
+            elif self.memory is not None and (peak_memory() or 0) >= self.memory:
+                self.reason = "memory"
+        return self.reason is not None
+
+    def elapsed(self):
+        """Seconds since the budget was created."""
+        return time.monotonic() - self.start
+
+    def exhausted(self):
+        """The result of a search stopped by this budget."""
+        return BudgetExhausted(
+            self.reason, self.visited, self.elapsed(), peak_memory(), self.deepest
+        )
+
+
+class BudgetExhausted:
+    """What a searcher returns when its Budget runs out: the reason, the
+    number of nodes visited, the seconds elapsed, the peak memory (in bytes,
+    or None if unknown) and the deepest node visited, whose state is the
+    most complete partial solution found. It is false in a boolean context,
+    like the None returned when there is no solution."""
+
+    def __init__(self, reason, nodes, seconds, memory, deepest):
+        self.reason = reason
+        self.nodes = nodes
+        self.seconds = seconds
+        self.memory = memory
+        self.deepest = deepest
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "<BudgetExhausted {}: {} nodes, {:.2f}s, depth {}>".format(
+            self.reason,
+            self.nodes,
+            self.seconds,
+            self.deepest.depth if self.deepest else None,
+        )
+
+
+def peak_memory():
+    """Peak resident memory of the process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def shared_state_node(problem, state, path):
+    """Node at the end of path (a list of actions from problem.initial) for the
+    searchers that change a single state in place: all the nodes on the path
+    share state, the state reached after the last action."""
+    node = Node(state)
+    for action in path:
+        node = Node(
+            state, node, action, problem.path_cost(node.path_cost, state, action, state)
+        )
+    return node
+
+
 # ______________________________________________________________________________
 # Uninformed Search algorithms
 
 
-def breadth_first_tree_search(problem):
+def breadth_first_tree_search(problem, lazy=False, budget=None):
     """
     [Figure 3.7]
     Search the shallowest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Repeats infinitely in case of loops.
+    If lazy is True, the frontier holds the unexpanded children of each
+    node (see Node.iter_expand) instead of the children themselves, so a
+    child is only built when it is popped. Nodes are visited in the same
+    order either way.
+    If a Budget is given, every node visited is charged to it, and the
+    search returns budget.exhausted() when it runs out.
     """
 
+    if lazy:
+        node = Node(problem.initial)
+        if problem.goal_test(node.state):
+            return node
+        if budget is not None and budget.spend(node.depth, node):
+            return budget.exhausted()
+        frontier = deque([node.iter_expand(problem)])  # FIFO queue of children
+
+        while frontier:
+            node = next(frontier[0], None)
+            if node is None:
+                frontier.popleft()
+                continue
+            if problem.goal_test(node.state):
+                return node
+            if budget is not None and budget.spend(node.depth, node):
+                return budget.exhausted()
+            frontier.append(node.iter_expand(problem))
+        return None
+
     frontier = deque([Node(problem.initial)])  # FIFO queue
 
     while frontier:
         node = frontier.popleft()
         if problem.goal_test(node.state):
             return node
+        if budget is not None and budget.spend(node.depth, node):
+            return budget.exhausted()
         frontier.extend(node.expand(problem))
     return None
 
 
-def depth_first_tree_search(problem):
+def depth_first_tree_search(problem, lazy=False, budget=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Repeats infinitely in case of loops.
+    If lazy is True, the frontier holds the unexpanded children of each
+    node (see Node.iter_expand) instead of the children themselves, so a
+    child is only built when it is popped. Nodes are visited in the same
+    order either way.
+    If a Budget is given, every node visited is charged to it, and the
+    search returns budget.exhausted() when it runs out.
     """
 
+    if lazy:
+        node = Node(problem.initial)
+        if problem.goal_test(node.state):
+            return node
+        if budget is not None and budget.spend(node.depth, node):
+            return budget.exhausted()
+        frontier = [node.iter_expand(problem, reverse=True)]  # Stack of children
+
+        while frontier:
+            node = next(frontier[-1], None)
+            if node is None:
+                frontier.pop()
+                continue
+            if problem.goal_test(node.state):
+                return node
+            if budget is not None and budget.spend(node.depth, node):
+                return budget.exhausted()
+            frontier.append(node.iter_expand(problem, reverse=True))
+        return None
+
     frontier = [Node(problem.initial)]  # Stack
 
     while frontier:
         node = frontier.pop()
         if problem.goal_test(node.state):
             return node
+        if budget is not None and budget.spend(node.depth, node):
+            return budget.exhausted()
         frontier.extend(node.expand(problem))
     return None
 
 
-def depth_first_graph_search(problem):
+def depth_first_backtracking_search(problem, limit=None, budget=None):
+    """
+    Search the deepest nodes in the search tree first, like
+    depth_first_tree_search, but change a single state in place instead of
+    building a new state for every child. The problem must provide
+    apply(state, action), which executes the action on state and returns a
+    mark, and undo(state, mark), which rolls state back to the given mark.
+    apply may instead return None, leaving state unchanged, to report that
+    the action leads to a state with no solution; that child is skipped.
+    Only one state is ever alive, so memory is proportional to the depth of
+    the search rather than to the size of the frontier.
+    Children are visited in the same order as in depth_first_tree_search.
+    The nodes on the returned path all share the (goal) state, which is
+    problem.initial itself.
+    If limit is given, the search gives up after that many calls to apply,
+    restores problem.initial and returns 'cutoff' (see restart_search).
+    If a Budget is given and runs out, problem.initial is restored too, and
+    the result is budget.exhausted(), whose deepest node holds a copy of the
+    deepest state visited.
+    """
+    state = problem.initial
+    path = []
+    applied = 0
+
+    def backtrack():
+        nonlocal applied
+        if problem.goal_test(state):
+            return True
+        if budget is not None and budget.spend(
+            len(path), lambda: shared_state_node(problem, copy.deepcopy(state), path)
+        ):
+            return "cutoff"
+        for action in reversed(list(problem.actions(state))):
+            if limit is not None and applied >= limit:
+                return "cutoff"
+            applied += 1
+            mark = problem.apply(state, action)
+            if mark is None:
+                continue
+            path.append(action)
+            result = backtrack()
+            if result is True:
+                return True
+            path.pop()
+            problem.undo(state, mark)
+            if result == "cutoff":
+                return result
+        return False
+
+    result = backtrack()
+    if budget is not None and budget.reason is not None:
+        return budget.exhausted()
+    if result is not True:
+        return result or None
+    return shared_state_node(problem, state, path)
+
+
+def backjumping_search(problem, nogoods=1000, limit=None, budget=None):
+    """
+    Search like depth_first_backtracking_search, but with conflict-directed
+    backjumping. Besides undo(state, mark), the problem must provide
+    apply(state, action, level), where level is the depth of the child (1 for
+    the children of the root); conflict(state), which returns the levels
+    (a bitmask, bit l for level l) whose actions explain why the last apply
+    failed; and exclusions(state, actions), which returns the levels that
+    explain why the children missing from actions are not possible.
+    When every child of a node fails, the node fails because of the levels
+    of its exclusions and of the conflicts of its children, without the
+    level of the children themselves. If a child fails for reasons that do
+    not include its own level, so would all of its siblings: the search
+    jumps straight back to the deepest level of that conflict.
+    The actions at the levels of each conflict are a nogood, a set of actions
+    that no solution contains. Up to 'nogoods' of them are kept in a
+    NogoodStore (0 turns it off) and used to skip children; this assumes that
+    the result of a set of actions does not depend on their order. A
+    NogoodStore may also be given, to keep its nogoods from an earlier search.
+    The nodes on the returned path all share the (goal) state, which is
+    problem.initial itself. limit and budget are as in
+    depth_first_backtracking_search.
+    """
+    state = problem.initial
+    path, levels = [], {}  # levels: action -> its level on the path
+    if isinstance(nogoods, NogoodStore):
+        store = nogoods
+    else:
+        store = NogoodStore(nogoods) if nogoods else None
+    applied = 0
+
+    def backjump():
+        """Return None if a goal was found, 'cutoff' if the limit was reached,
+        or else the conflict of the node."""
+        nonlocal applied
+        if problem.goal_test(state):
+            return None
+        if budget is not None and budget.spend(
+            len(path), lambda: shared_state_node(problem, copy.deepcopy(state), path)
+        ):
+            return "cutoff"
+        actions = list(problem.actions(state))
+        level = len(path) + 1
+        own = 1 << level
+        conflict = 0
+        for action in reversed(actions):
+            if limit is not None and applied >= limit:
+                return "cutoff"
+            if store is not None:
+                nogood = store.violated(levels.keys() | {action}, action)
+                if nogood is not None:
+                    for other in nogood - {action}:
+                        conflict |= 1 << levels[other]
+                    continue
+
+            applied += 1
+            mark = problem.apply(state, action, level)
+            if mark is None:
+                reason = problem.conflict(state)
+            else:
+                path.append(action)
+                levels[action] = level
+                reason = backjump()
+                if reason is None:
+                    return None
+                path.pop()
+                del levels[action]
+                problem.undo(state, mark)
+                if reason == "cutoff":
+                    return reason
+
+            if not reason & own:
+                return reason
+            conflict |= reason & ~own
+
+        conflict |= problem.exclusions(state, actions)
+        if store is not None:
+            store.add(action for action, l in levels.items() if conflict >> l & 1)
+        return conflict
+
+    result = backjump()
+    if budget is not None and budget.reason is not None:
+        return budget.exhausted()
+    if result is not None:
+        return "cutoff" if result == "cutoff" else None
+    return shared_state_node(problem, state, path)
+
+
+def luby_schedule(base=100):
+    """Node limits for restart_search: base times the Luby sequence."""
+    return lambda i: base * luby(i)
+
+
+def geometric_schedule(base=100, factor=1.5):
+    """Node limits for restart_search, growing by factor after each restart."""
+    return lambda i: int(base * factor ** (i - 1))
+
+
+def restart_search(
+    problem, schedule=luby_schedule(), nogoods=0, restarts=None, budget=None
+):
+    """
+    Run depth_first_backtracking_search from the root over and over, the
+    i-th time (from 1) with a limit of schedule(i) calls to apply, until it
+    finds a goal or proves that there is none. This only pays off when the
+    problem orders its actions at random (with ties broken differently on
+    every run): a run that gets stuck below an early bad choice is cut short
+    instead of exploring the whole subtree. With the Luby schedule the total
+    work is within a logarithmic factor of the best fixed limit.
+    If nogoods is not 0, the runs use backjumping_search instead, sharing a
+    NogoodStore of that size, so that later runs skip what earlier ones
+    learned. Returns 'cutoff' if 'restarts' runs are not enough.
+    A Budget, if given, is shared by all the runs.
+    """
+    store = NogoodStore(nogoods) if nogoods else None
+    i = 0
+    while restarts is None or i < restarts:
+        i += 1
+        if store is None:
+            result = depth_first_backtracking_search(problem, schedule(i), budget)
+        else:
+            result = backjumping_search(problem, store, schedule(i), budget)
+        if result != "cutoff":
+            return result
+    return "cutoff"
+
+
+def save_checkpoint(filename, data):
+    """Write data to filename, pickled and compressed with gzip. The file is
+    replaced atomically, so a crash while writing leaves the previous
+    checkpoint intact."""
+    with gzip.open(filename + ".tmp", "wb") as file:
+        pickle.dump(data, file, pickle.HIGHEST_PROTOCOL)
+    os.replace(filename + ".tmp", filename)
+
+
+def load_checkpoint(filename):
+    """Read the data written by save_checkpoint."""
+    with gzip.open(filename, "rb") as file:
+        return pickle.load(file)
+
+
+def checkpointed_search(problem, filename, interval=60, info=None):
+    """
+    Search like depth_first_backtracking_search (same problem interface, same
+    order of children), but with an explicit stack, which every 'interval'
+    seconds is saved to filename (see save_checkpoint) so that the search can
+    be continued by resume_search after a crash. The checkpoint holds a copy
+    of the problem with the initial state as it was before the search, which
+    carries any random number generator of the problem with its state; the
+    actions on the current path; the actions still to try at each level; the
+    number of calls to apply so far; and info, anything else the caller needs
+    in order to resume (it is returned by resume_search). The problem and its
+    states must be picklable. The checkpoint is removed when the search ends.
+    """
+    return resume_search(
+        filename,
+        interval,
+        {"problem": problem, "path": [], "levels": None, "applied": 0, "info": info},
+    )[0]
+
+
+def resume_search(filename, interval=60, checkpoint=None):
+    """
+    Continue the search of checkpointed_search from the checkpoint in filename
+    (or from the given one), replaying the saved path from the initial state,
+    and keep saving checkpoints there. Returns the result of the search and
+    the info stored in the checkpoint.
+    """
+    if checkpoint is None:
+        checkpoint = load_checkpoint(filename)
+    problem, path = checkpoint["problem"], checkpoint["path"]
+    levels, applied = checkpoint["levels"], checkpoint["applied"]
+    state = problem.initial
+    root = copy.deepcopy(state)
+
+    def save():
+        saved = copy.copy(problem)
+        saved.initial = root
+        save_checkpoint(
+            filename,
+            {
+                "problem": saved,
+                "path": path,
+                "levels": levels,
+                "applied": applied,
+                "info": checkpoint["info"],
+            },
+        )
+
+    def finish(result):
+        if os.path.exists(filename):
+            os.remove(filename)
+        return result, checkpoint["info"]
+
+    marks = [problem.apply(state, action) for action in path]
+    if levels is None:
+        if problem.goal_test(state):
+            return finish(shared_state_node(problem, state, path))
+        levels = [list(problem.actions(state))]
+
+    # levels[i] holds the actions still to try in the state reached by path[:i].
+    last = time.monotonic()
+    while levels:
+        if time.monotonic() - last >= interval:
+            save()
+            last = time.monotonic()
+        if not levels[-1]:
+            levels.pop()
+            if marks:
+                problem.undo(state, marks.pop())
+                path.pop()
+            continue
+
+        action = levels[-1].pop()
+        applied += 1
+        mark = problem.apply(state, action)
+        if mark is None:
+            continue
+        marks.append(mark)
+        path.append(action)
+        if problem.goal_test(state):
+            return finish(shared_state_node(problem, state, path))
+        levels.append(list(problem.actions(state)))
+    return finish(None)
+
+
+def depth_first_graph_search(problem, budget=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
@@ -227,56 +703,82 @@ def depth_first_graph_search(problem):
     The argument frontier should be an empty queue.
     Does not get trapped by loops.
     If two paths reach a state, only use the first one.
+    The states in the frontier are mirrored in a set, so that checking
+    whether a child is already in the frontier takes constant time.
+    budget is as in depth_first_tree_search.
     """
-    frontier = [(Node(problem.initial))]  # Stack
+    frontier = [Node(problem.initial)]  # Stack
+    frontier_states = {problem.initial}
 
     explored = set()
     while frontier:
         node = frontier.pop()
+        frontier_states.discard(node.state)
         if problem.goal_test(node.state):
             return node
+        if budget is not None and budget.spend(node.depth, node):
+            return budget.exhausted()
         explored.add(node.state)
-        frontier.extend(
-            child
-            for child in node.expand(problem)
-            if child.state not in explored and child not in frontier
-        )
+        for child in node.expand(problem):
+            if child.state not in explored and child.state not in frontier_states:
+                frontier.append(child)
+                frontier_states.add(child.state)
     return None
 
 
-def breadth_first_graph_search(problem):
+def breadth_first_graph_search(problem, budget=None):
     """[Figure 3.11]
     Note that this function can be implemented in a
     single line as below:
     return graph_search(problem, FIFOQueue())
+    The states in the frontier are mirrored in a set, so that checking
+    whether a child is already in the frontier takes constant time.
+    budget is as in depth_first_tree_search.
     """
     node = Node(problem.initial)
     if problem.goal_test(node.state):
         return node
     frontier = deque([node])
+    frontier_states = {node.state}
     explored = set()
     while frontier:
         node = frontier.popleft()
+        frontier_states.discard(node.state)
+        if budget is not None and budget.spend(node.depth, node):
+            return budget.exhausted()
         explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if child.state not in explored and child.state not in frontier_states:
                 if problem.goal_test(child.state):
                     return child
                 frontier.append(child)
+                frontier_states.add(child.state)
     return None
 
 
-def best_first_graph_search(problem, f, display=False):
+def best_first_graph_search(problem, f, display=False, budget=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    If the problem has an f_bound attribute, the f values are taken to be
+    integers between 0 and f_bound, and the frontier is a BucketPriorityQueue
+    (which pops nodes with the same f value in the order they were added).
+    Nodes whose f value is infinite (such as states a heuristic proves to be
+    dead ends) are never added to the frontier.
+    budget is as in depth_first_tree_search."""
     f = memoize(f, "f")
     node = Node(problem.initial)
-    frontier = PriorityQueue("min", f)
+    f_bound = getattr(problem, "f_bound", None)
+    if f_bound is not None:
+        frontier = BucketPriorityQueue("min", f, f_bound)
+    else:
+        frontier = IndexedPriorityQueue("min", f)
+    if f(node) == np.inf:
+        return None
     frontier.append(node)
     explored = set()
     while frontier:
@@ -290,8 +792,12 @@ def best_first_graph_search(problem, f, display=False):
                     "paths remain in the frontier",
                 )
             return node
+        if budget is not None and budget.spend(node.depth, node):
+            return budget.exhausted()
         explored.add(node.state)
         for child in node.expand(problem):
+            if f(child) == np.inf:
+                continue
             if child.state not in explored and child not in frontier:
                 frontier.append(child)
             elif child in frontier:
@@ -301,22 +807,27 @@ def best_first_graph_search(problem, f, display=False):
     return None
 
 
-def uniform_cost_search(problem, display=False):
+def uniform_cost_search(problem, display=False, budget=None):
     """[Figure 3.14]"""
-    return best_first_graph_search(problem, lambda node: node.path_cost, display)
+    return best_first_graph_search(
+        problem, lambda node: node.path_cost, display, budget
+    )
 
 
-def depth_limited_search(problem, limit=50):
-    """[Figure 3.17]"""
+def depth_limited_search(problem, limit=50, budget=None):
+    """[Figure 3.17]
+    budget is as in depth_first_tree_search."""
 
     def recursive_dls(node, problem, limit):
         if problem.goal_test(node.state):
             return node
+        elif budget is not None and budget.spend(node.depth, node):
+            return "cutoff"
         elif limit == 0:
             return "cutoff"
         else:
             cutoff_occurred = False
-            for child in node.expand(problem):
+            for child in node.iter_expand(problem):
                 result = recursive_dls(child, problem, limit - 1)
                 if result == "cutoff":
                     cutoff_occurred = True
@@ -325,15 +836,118 @@ def depth_limited_search(problem, limit=50):
             return "cutoff" if cutoff_occurred else None
 
     # Body of depth_limited_search:
-    return recursive_dls(Node(problem.initial), problem, limit)
+    result = recursive_dls(Node(problem.initial), problem, limit)
+    if budget is not None and budget.reason is not None:
+        return budget.exhausted()
+    return result
 
 
-def iterative_deepening_search(problem):
-    """[Figure 3.18]"""
+def iterative_deepening_search(problem, budget=None):
+    """[Figure 3.18]
+    A Budget, if given, is shared by all the iterations."""
     for depth in range(sys.maxsize):
-        result = depth_limited_search(problem, depth)
+        result = depth_limited_search(problem, depth, budget)
+        if result != "cutoff":
+            return result
+
+
+def limited_discrepancy_search(problem, max_discrepancies=None, budget=None):
+    """
+    [Harvey and Ginsberg, 1995]
+    Trust the order of problem.actions: at each node, the heuristic choice
+    is the first child that depth_first_tree_search would explore (the last
+    action that does not lead to a dead end), and any other child is a
+    discrepancy. The k-th probe (from 0) searches depth-first the paths
+    with at most k discrepancies, so the solutions that deviate least from
+    the heuristic are found first, and a single bad early choice costs one
+    probe instead of its whole subtree. Stops when a probe was not held back
+    by its limit (the whole tree was searched) and returns None, or returns
+    'cutoff' after max_discrepancies. A Budget, if given, is shared by all
+    the probes.
+    """
+
+    def probe(node, k):
+        if problem.goal_test(node.state):
+            return node
+        if budget is not None and budget.spend(node.depth, node):
+            return "cutoff"
+        cutoff_occurred = False
+        heuristic = True
+        for action in reversed(list(problem.actions(node.state))):
+            if not heuristic and k == 0:
+                cutoff_occurred = True
+                break
+            child = node.child_node(problem, action)
+            if child is None:
+                continue
+            result = probe(child, k if heuristic else k - 1)
+            heuristic = False
+            if result == "cutoff":
+                cutoff_occurred = True
+            elif result is not None:
+                return result
+        return "cutoff" if cutoff_occurred else None
+
+    k = 0
+    while max_discrepancies is None or k <= max_discrepancies:
+        result = probe(Node(problem.initial), k)
+        if budget is not None and budget.reason is not None:
+            return budget.exhausted()
+        if result != "cutoff":
+            return result
+        k += 1
+    return "cutoff"
+
+
+def depth_bounded_discrepancy_search(problem, max_depth=None, budget=None):
+    """
+    [Walsh, 1997]
+    Like limited_discrepancy_search, but the i-th probe (from 0) bounds the
+    depth of the discrepancies instead of their number: above depth i - 1
+    every child is explored, at depth i - 1 only the discrepancies and below
+    it only the heuristic choices. Each path is thus explored by one probe
+    only, and early choices, where heuristics are least informed, are
+    revised first. Returns None once no node at depth i - 1 has children
+    (no path has a discrepancy deeper than the earlier probes allowed), or
+    'cutoff' after max_depth. budget is as in limited_discrepancy_search.
+    """
+
+    def probe(node, depth, i):
+        if problem.goal_test(node.state):
+            return node
+        if budget is not None and budget.spend(node.depth, node):
+            return "cutoff"
+        cutoff_occurred = False
+        heuristic = True
+        for action in reversed(list(problem.actions(node.state))):
+            if not heuristic and depth >= i:
+                cutoff_occurred = True
+                break
+            child = node.child_node(problem, action)
+            if child is None:
+                continue
+            if heuristic:
+                heuristic = False
+                if depth == i - 1:
+                    # Explored by the earlier probes, but may hold deeper choices.
+                    cutoff_occurred = True
+                    continue
+            result = probe(child, depth + 1, i)
+            if result == "cutoff":
+                cutoff_occurred = True
+            elif result is not None:
+                return result
+        return "cutoff" if cutoff_occurred else None
+
+    i = 0
+    while max_depth is None or i <= max_depth:
+        result = probe(Node(problem.initial), 0, i)
+        if budget is not None and budget.reason is not None:
+            return budget.exhausted()
         if result != "cutoff":
             return result
+        i += 1
+    return "cutoff"
 
 
 # ______________________________________________________________________________
@@ -425,18 +1039,20 @@ greedy_best_first_graph_search = best_first_graph_search
 
 
 # Greedy best-first search is accomplished by specifying f(n) = h(n).
-def greedy_search(problem, h=None):
+def greedy_search(problem, h=None, budget=None):
     """f(n) = h(n)"""
     h = memoize(h or problem.h, "h")
-    return best_first_graph_search(problem, h)
+    return best_first_graph_search(problem, h, budget=budget)
 
 
-def astar_search(problem, h=None, display=False):
+def astar_search(problem, h=None, display=False, budget=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
     else in your Problem subclass."""
     h = memoize(h or problem.h, "h")
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
+    return best_first_graph_search(
+        problem, lambda n: n.path_cost + h(n), display, budget
+    )
 
 
 # ______________________________________________________________________________
@@ -620,13 +1236,17 @@ class PlanRoute(Problem):
 # Other search algorithms
 
 
-def recursive_best_first_search(problem, h=None):
-    """[Figure 3.26]"""
+def recursive_best_first_search(problem, h=None, budget=None):
+    """[Figure 3.26]
+    budget is as in depth_first_tree_search: once it runs out, every node
+    fails with an infinite f, which unwinds the recursion."""
     h = memoize(h or problem.h, "h")
 
     def RBFS(problem, node, flimit):
         if problem.goal_test(node.state):
             return node, 0  # (The second value is immaterial)
+        if budget is not None and budget.spend(node.depth, node):
+            return None, np.inf
         successors = node.expand(problem)
         if len(successors) == 0:
             return None, np.inf
@@ -636,7 +1256,7 @@ def recursive_best_first_search(problem, h=None):
             # Order by lowest f value
             successors.sort(key=lambda x: x.f)
             best = successors[0]
-            if best.f > flimit:
+            if best.f > flimit or best.f == np.inf:
                 return None, best.f
             if len(successors) > 1:
                 alternative = successors[1].f
@@ -649,6 +1269,8 @@ def recursive_best_first_search(problem, h=None):
     node = Node(problem.initial)
     node.f = h(node)
     result, bestf = RBFS(problem, node, np.inf)
+    if budget is not None and budget.reason is not None:
+        return budget.exhausted()
     return result
 
 
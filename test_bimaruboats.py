@@ -0,0 +1,129 @@
+# test_bimaruboats.py: Testes de regressão do solver de Bimaru (correr com pytest).
+
+import io
+import os
+import sys
+import subprocess
+import tracemalloc
+from array import array
+
+from benchmark import node_memory, read_instance
+from bimaruboats import Board, BimaruState, Bimaru
+from search import (
+    Node,
+    depth_first_backtracking_search,
+    backjumping_search,
+    restart_search,
+)
+
+INSTANCES = os.path.join(os.path.dirname(__file__), "instances-students")
+INSTANCE = os.path.join(INSTANCES, "instance10.txt")  # com ações na raiz
+
+# Instancia sem solução cuja raiz (depois da propagação inicial) nao tem ações.
+NO_ACTIONS = """ROW\t2\t2\t1\t2\t3\t1\t2\t3\t4\t0
+COLUMN\t1\t2\t2\t1\t2\t1\t6\t1\t3\t1
+4
+HINT\t0\t8\tR
+HINT\t7\t6\tW
+HINT\t7\t0\tW
+HINT\t7\t8\tT
+"""
+
+
+def parse(text: str) -> Board:
+    """Lê uma instancia dada como texto, como Board.parse_instance lê do stdin."""
+    stdin = sys.stdin
+    try:
+        sys.stdin = io.StringIO(text)
+        return Board.parse_instance()[0]
+    finally:
+        sys.stdin = stdin
+
+
+class DictLayout:
+    """Copia de um objeto com os campos num __dict__ e os arrays em listas, como os
+    nós, estados e tabuleiros eram guardados antes de usarem __slots__."""
+
+    def __init__(self, original, **fields):
+        for name in type(original).__slots__:
+            value = fields.get(name, getattr(original, name, None))
+            if isinstance(value, array):
+                value = value.tolist()
+            setattr(self, name, value)
+
+
+def dict_node_memory(path: str, count=1000) -> float:
+    """Memoria por nó (como benchmark.node_memory) com a disposição de DictLayout."""
+    board, hints = read_instance(path)
+    problem = Bimaru(board)
+    root = Node(problem.initial)
+    actions = list(problem.actions(problem.initial))
+    for action in actions:
+        root.child_node(problem, action)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = []
+    for i in range(count):
+        child = root.child_node(problem, actions[i % len(actions)])
+        if child is None:
+            continue
+        board = child.state.board
+        state = DictLayout(
+            child.state, board=DictLayout(board, masks=dict(board.masks))
+        )
+        nodes.append(DictLayout(child, state=state))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return (after - before) / len(nodes)
+
+
+def test_node_memory():
+    """Cada nó criado pela procura (Node.child_node: nó, estado e tabuleiro) ocupa
+    menos de 3500 bytes, e menos do que com os campos num __dict__ e os contadores
+    em listas. Um trail esquecido no tabuleiro (ver Bimaru.result) passa o limite."""
+    memory = node_memory(INSTANCE, 200)
+    assert memory < 3500
+    assert memory < dict_node_memory(INSTANCE, 200)
+
+
+def test_root_without_actions():
+    """As procuras com retrocesso (com e sem backjumping e nogoods) retornam None
+    quando a raiz nao tem ações, em vez de lerem causas que nunca foram registadas."""
+    problem = Bimaru(parse(NO_ACTIONS))
+    assert not problem.initial.board.invalid
+    assert not list(problem.actions(problem.initial))
+
+    assert depth_first_backtracking_search(Bimaru(parse(NO_ACTIONS))) is None
+    assert backjumping_search(Bimaru(parse(NO_ACTIONS))) is None
+    assert restart_search(Bimaru(parse(NO_ACTIONS)), nogoods=100) is None
+
+
+def test_main_without_solution():
+    """bimaruboats.py --backjump reporta que a instancia nao tem solução."""
+    result = subprocess.run(
+        [sys.executable, "bimaruboats.py", "--backjump"],
+        input=NO_ACTIONS,
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    assert result.returncode == 1
+    assert result.stdout == "Sem solução\n"
+
+
+def test_main_budget_exhausted():
+    """Quando o orçamento acaba, bimaruboats.py mostra o tabuleiro mais completo e
+    sai com o estado 2, distinto do de uma instancia sem solução."""
+    with open(INSTANCE) as f:
+        result = subprocess.run(
+            [sys.executable, "bimaruboats.py", "--max-nodes", "5"],
+            stdin=f,
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    assert result.returncode == 2
+    assert result.stdout.count("\n") == 10
+    assert "Procura interrompida" in result.stderr
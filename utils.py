@@ -13,7 +13,6 @@ from statistics import mean
 
 import numpy as np
 
-
 # ______________________________________________________________________________
 # Functions on Sequences and Iterables
 
@@ -147,6 +146,19 @@ def histogram(values, mode=0, bin_function=None):
         return sorted(bins.items())
 
 
+def luby(i):
+    """Return the i-th term (from 1) of the Luby sequence: 1 1 2 1 1 2 4 ..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while (1 << k) - 1 != i:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+
 def dot_product(x, y):
     """Return the sum of the element-wise product of vectors x and y."""
     return sum(_x * _y for _x, _y in zip(x, y))
@@ -814,6 +826,220 @@ class PriorityQueue:
         heapq.heapify(self.heap)
 
 
+class IndexedPriorityQueue(PriorityQueue):
+    """A PriorityQueue that also keeps the position of each item in the heap,
+    so that membership tests and lookups take O(1) and deletions O(log n),
+    instead of a linear scan. Items must be hashable, and equal items share a
+    single entry: appending an item that is already queued updates its value.
+    Ties are broken by comparing the items, as in PriorityQueue."""
+
+    def __init__(self, order="min", f=lambda x: x):
+        super().__init__(order, f)
+        self.index = {}
+
+    def append(self, item):
+        """Insert item at its correct position (or move it there, if an equal
+        item is already in the queue)."""
+        if item in self.index:
+            del self[item]
+        self.heap.append((self.f(item), item))
+        self._sift_up(len(self.heap) - 1)
+
+    def pop(self):
+        """Pop and return the item (with min or max f(x) value)
+        depending on the order."""
+        if not self.heap:
+            raise Exception("Trying to pop from empty PriorityQueue.")
+        item = self.heap[0][1]
+        del self[item]
+        return item
+
+    def __contains__(self, key):
+        """Return True if the key is in PriorityQueue."""
+        return key in self.index
+
+    def __getitem__(self, key):
+        """Returns the value associated with key in PriorityQueue.
+        Raises KeyError if key is not present."""
+        try:
+            return self.heap[self.index[key]][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+
+    def __delitem__(self, key):
+        """Delete key, moving the last entry of the heap into its place."""
+        try:
+            position = self.index.pop(key)
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        last = self.heap.pop()
+        if position < len(self.heap):
+            self._move(position, last)
+            self._sift_down(self._sift_up(position))
+
+    def _move(self, position, entry):
+        self.heap[position] = entry
+        self.index[entry[1]] = position
+
+    def _sift_up(self, position):
+        """Move the entry at position towards the root while it is smaller
+        than its parent. Returns its final position."""
+        heap, entry = self.heap, self.heap[position]
+        while position > 0:
+            parent = (position - 1) // 2
+            if not entry < heap[parent]:
+                break
+            self._move(position, heap[parent])
+            position = parent
+        self._move(position, entry)
+        return position
+
+    def _sift_down(self, position):
+        """Move the entry at position towards the leaves while it is larger
+        than its smallest child. Returns its final position."""
+        heap, entry = self.heap, self.heap[position]
+        while True:
+            child = 2 * position + 1
+            if child >= len(heap):
+                break
+            if child + 1 < len(heap) and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            self._move(position, heap[child])
+            position = child
+        self._move(position, entry)
+        return position
+
+
+class BucketPriorityQueue:
+    """A Queue for items whose f(x) values are integers between 0 and bound
+    (inclusive), such as the f values of A* on a problem with small integer
+    costs and heuristic. Items are kept in one FIFO bucket per value, so
+    append is O(1) and pop is O(1) amortized when the values popped do not
+    decrease (and O(bound) at worst). Items with the same value are popped in
+    the order they were appended. Supports the same dict-like lookup as
+    PriorityQueue; items must be hashable, and deleted items are only dropped
+    from their bucket when they reach its front."""
+
+    def __init__(self, order="min", f=lambda x: x, bound=0):
+        if order == "min":
+            self.f = f
+        elif order == "max":  # now item with max f(x)
+            self.f = lambda x: bound - f(x)  # will be popped first
+        else:
+            raise ValueError("Order must be either 'min' or 'max'.")
+        self.buckets = [collections.deque() for _ in range(bound + 1)]
+        self.index = {}  # item -> (value, entry), with entry = [item] in its bucket
+        self.low = bound + 1  # no bucket before this one has entries
+
+    def append(self, item):
+        """Insert item at its correct position (or move it there, if an equal
+        item is already in the queue)."""
+        value = self.f(item)
+        if not (isinstance(value, int) and 0 <= value < len(self.buckets)):
+            raise ValueError(
+                "Value "
+                + str(value)
+                + " is out of the range of the BucketPriorityQueue."
+            )
+        if item in self.index:
+            del self[item]
+        entry = [item]
+        self.buckets[value].append(entry)
+        self.index[item] = (value, entry)
+        self.low = min(self.low, value)
+
+    def extend(self, items):
+        """Insert each item in items at its correct position."""
+        for item in items:
+            self.append(item)
+
+    def pop(self):
+        """Pop and return the item (with min or max f(x) value)
+        depending on the order."""
+        if not self.index:
+            raise Exception("Trying to pop from empty BucketPriorityQueue.")
+        while True:
+            bucket = self.buckets[self.low]
+            while bucket:
+                entry = bucket.popleft()
+                if entry:  # deleted entries are left empty
+                    item = entry[0]
+                    del self.index[item]
+                    return item
+            self.low += 1
+
+    def __len__(self):
+        """Return current capacity of BucketPriorityQueue."""
+        return len(self.index)
+
+    def __contains__(self, key):
+        """Return True if the key is in BucketPriorityQueue."""
+        return key in self.index
+
+    def __getitem__(self, key):
+        """Returns the value associated with key in BucketPriorityQueue.
+        Raises KeyError if key is not present."""
+        try:
+            return self.index[key][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+
+    def __delitem__(self, key):
+        """Delete key, leaving its (now empty) entry in its bucket."""
+        try:
+            value, entry = self.index.pop(key)
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
+        entry.clear()
+
+
+class NogoodStore:
+    """A bounded store of nogoods: sets of items (such as the actions of a
+    search) that cannot all be part of a solution. When more than size
+    nogoods are stored, the least recently used one is dropped. Each nogood
+    is indexed by every item in it, so that checking the items just extended
+    with a new item only looks at the nogoods that contain the new item."""
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.nogoods = collections.OrderedDict()  # nogood -> None, oldest first
+        self.watches = collections.defaultdict(set)  # item -> nogoods with it
+        self.hits = 0
+
+    def add(self, items):
+        """Store the nogood made of the given items (empty nogoods are ignored)."""
+        nogood = frozenset(items)
+        if not nogood:
+            return
+        if nogood in self.nogoods:
+            self.nogoods.move_to_end(nogood)
+            return
+        self.nogoods[nogood] = None
+        for item in nogood:
+            self.watches[item].add(nogood)
+        if len(self.nogoods) > self.size:
+            old, _ = self.nogoods.popitem(last=False)
+            for item in old:
+                self.watches[item].discard(old)
+                if not self.watches[item]:
+                    del self.watches[item]
+
+    def violated(self, items, item):
+        """Return a stored nogood that contains item and is a subset of items
+        (which must include item), or None if there is no such nogood."""
+        for nogood in self.watches.get(item, ()):
+            if nogood <= items:
+                self.nogoods.move_to_end(nogood)
+                self.hits += 1
+                return nogood
+        return None
+
+    def __len__(self):
+        return len(self.nogoods)
+
+
 # ______________________________________________________________________________
 # Useful Shorthands
 